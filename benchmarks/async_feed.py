@@ -0,0 +1,219 @@
+"""Concurrency of the sync and the async feed views under slow database I/O.
+
+The database uses the production SQLite profile. Every query gets an extra
+delay, as with a remote or overloaded disk. The sync views are served by
+the WSGI handler in a fixed number of threads, like gunicorn sync workers,
+one request per worker at a time. The async views (``posts.async_views``)
+are served by the ASGI handler (``yatube.asgi``) on a single event loop
+with their queries in a thread pool, like one ASGI worker. Requests go
+through the whole middleware stack and the URLconf; every request has its
+own query string, so the page cache always misses and renders anew. The
+shared cache tier is kept in memory: its writes would otherwise queue for
+the SQLite write lock along with the delayed queries.
+
+    python benchmarks/async_feed.py --view profile --latency 20 --requests 200
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+VIEWS = {
+    "index": ("index", lambda post: ()),
+    "profile": ("profile", lambda post: ("writer",)),
+    "post": ("post_single", lambda post: ("writer", post.pk)),
+}
+
+
+def setup(directory, posts):
+    from yatube.sqlite import PRODUCTION_PRAGMAS, PRODUCTION_TRANSACTION_MODE
+
+    settings.DATABASES["default"]["NAME"] = os.path.join(directory, "bench.sqlite3")
+    settings.SQLITE_PRAGMAS = PRODUCTION_PRAGMAS
+    settings.SQLITE_TRANSACTION_MODE = PRODUCTION_TRANSACTION_MODE
+    settings.DATABASES["default"]["CONN_MAX_AGE"] = 600
+    settings.ALLOWED_HOSTS = ["testserver"]
+    settings.CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    }
+    django.setup()
+    from django.core.management import call_command
+
+    from posts.models import Comment, Follow, Post, User
+
+    call_command("migrate", verbosity=0)
+    author = User.objects.create_user("writer")
+    reader = User.objects.create_user("reader")
+    Follow.objects.create(user=reader, author=author)
+    for number in range(posts):
+        post = Post.objects.create(text=f"Post {number}", author=author)
+    for number in range(5):
+        Comment.objects.create(post=post, author=reader, text=f"Comment {number}")
+    return post
+
+
+def slow_queries(latency):
+    from django.db.backends import utils
+
+    execute = utils.CursorWrapper.execute
+
+    def slow_execute(self, sql, params=None):
+        time.sleep(latency)
+        return execute(self, sql, params)
+
+    utils.CursorWrapper.execute = slow_execute
+
+
+def load_urls(asynchronous):
+    """Reload the URLconf with ``ASYNC_VIEWS`` on or off."""
+    from django.urls import clear_url_caches
+
+    settings.ASYNC_VIEWS = asynchronous
+    importlib.reload(importlib.import_module("posts.urls"))
+    # корневой URLconf держит вложенный резолвер со старыми маршрутами
+    importlib.reload(importlib.import_module("yatube.urls"))
+    clear_url_caches()
+
+
+def wsgi_get(application, path, query):
+    from django.test import RequestFactory
+
+    environ = RequestFactory()._base_environ(PATH_INFO=path, QUERY_STRING=query)
+    statuses = []
+    response = application(environ, lambda status, headers: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return statuses[0]
+
+
+async def asgi_get(application, path, query):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]["status"]
+
+
+def run_sync(path, requests, workers):
+    from django.core.wsgi import get_wsgi_application
+
+    load_urls(asynchronous=False)
+    application = get_wsgi_application()
+
+    def call(number):
+        started = time.monotonic()
+        # свой адрес у каждого запроса: страница не находится в кэше
+        wsgi_get(application, path, f"n=sync-{number}")
+        return time.monotonic() - started
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(workers) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    return time.monotonic() - started, latencies
+
+
+def run_async(path, requests, concurrency, threads):
+    from django.core.asgi import get_asgi_application
+
+    load_urls(asynchronous=True)
+    application = get_asgi_application()
+
+    async def call(semaphore, number):
+        async with semaphore:
+            started = time.monotonic()
+            await asgi_get(application, path, f"n=async-{number}")
+            return time.monotonic() - started
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(threads))
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(
+            *[call(semaphore, number) for number in range(requests)]
+        )
+
+    started = time.monotonic()
+    latencies = asyncio.run(main())
+    return time.monotonic() - started, latencies
+
+
+def summary(elapsed, latencies):
+    latencies = sorted(latencies)
+    return {
+        "requests/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--view", choices=VIEWS, default="profile")
+    parser.add_argument("--latency", type=float, default=20, help="ms per query")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4, help="sync workers")
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="requests in flight (async)"
+    )
+    parser.add_argument("--threads", type=int, default=32, help="async DB threads")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        post = setup(directory, options.posts)
+        from django.core.wsgi import get_wsgi_application
+        from django.urls import reverse
+
+        name, args = VIEWS[options.view]
+        load_urls(asynchronous=False)
+        path = reverse(name, args=args(post))
+        # счётчики списков и профилей заводятся при первом запросе
+        wsgi_get(get_wsgi_application(), path, "n=warm-up")
+        slow_queries(options.latency / 1000)
+
+        results = {
+            f"sync x{options.workers}": run_sync(
+                path, options.requests, options.workers
+            ),
+            "async x1": run_async(
+                path, options.requests, options.concurrency, options.threads
+            ),
+        }
+    for label, (elapsed, latencies) in results.items():
+        result = summary(elapsed, latencies)
+        line = ", ".join(f"{key}: {value:.1f}" for key, value in result.items())
+        print(f"{label:>10}: {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Lock contention of the default and the production SQLite profiles.
+
+Several processes (like gunicorn workers) hit one database file: most
+requests read a page of posts, the rest publish a post or a comment. The
+default profile opens a connection per request with the library defaults,
+as Django does without CONN_MAX_AGE; the production profile keeps one
+connection per worker, applies ``PRODUCTION_PRAGMAS`` and begins write
+transactions with ``PRODUCTION_TRANSACTION_MODE``.
+
+    python benchmarks/sqlite_contention.py --workers 8 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yatube.sqlite import (  # noqa: E402
+    PRODUCTION_PRAGMAS,
+    PRODUCTION_TRANSACTION_MODE,
+)
+
+SCHEMA = """
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    pub_date REAL NOT NULL,
+    comment_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX post_pub_date ON post (pub_date);
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES post (id),
+    text TEXT NOT NULL
+);
+"""
+
+
+def connect(path, production):
+    # как Django: автокоммит, транзакции открываются явным BEGIN
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if production:
+        for name, value in PRODUCTION_PRAGMAS.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+    return connection
+
+
+def request(connection, write_ratio, begin):
+    if random.random() >= write_ratio:
+        connection.execute(
+            "SELECT id, text FROM post ORDER BY pub_date DESC LIMIT 10"
+        ).fetchall()
+        return
+    connection.execute(begin)
+    try:
+        if random.random() < 0.5:
+            connection.execute(
+                "INSERT INTO post (text, pub_date) VALUES (?, ?)",
+                ("post " * 50, time.time()),
+            )
+        else:
+            (post_id,) = connection.execute("SELECT max(id) FROM post").fetchone()
+            connection.execute(
+                "INSERT INTO comment (post_id, text) VALUES (?, ?)",
+                (post_id, "comment"),
+            )
+            connection.execute(
+                "UPDATE post SET comment_count = comment_count + 1 WHERE id = ?",
+                (post_id,),
+            )
+        connection.execute("COMMIT")
+    except sqlite3.OperationalError:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+
+
+def worker(path, production, seconds, write_ratio, results):
+    latencies, errors = [], 0
+    # без CONN_MAX_AGE Django открывает новое соединение на каждый запрос
+    persistent = connect(path, production) if production else None
+    begin = f"BEGIN {PRODUCTION_TRANSACTION_MODE}" if production else "BEGIN"
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        connection = persistent or connect(path, production)
+        try:
+            request(connection, write_ratio, begin)
+        except sqlite3.OperationalError:
+            # "database is locked"
+            errors += 1
+        else:
+            latencies.append(time.monotonic() - started)
+        finally:
+            if persistent is None:
+                connection.close()
+    results.put((latencies, errors))
+
+
+def run(production, workers, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.sqlite3")
+        connection = connect(path, production)
+        connection.executescript(SCHEMA)
+        connection.executemany(
+            "INSERT INTO post (text, pub_date) VALUES (?, ?)",
+            [("post " * 50, time.time()) for _ in range(1000)],
+        )
+        connection.close()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=worker, args=(path, production, seconds, write_ratio, results)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    latencies = sorted(latency for items, _ in outcomes for latency in items)
+    errors = sum(errors for _, errors in outcomes)
+    return {
+        "requests/s": len(latencies) / seconds,
+        "p50 ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        "locked errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    options = parser.parse_args()
+    for name, production in (("default", False), ("production", True)):
+        result = run(production, options.workers, options.seconds, options.write_ratio)
+        summary = ", ".join(f"{key}: {value:.1f}" for key, value in result.items())
+        print(f"{name:>10}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
 #!/bin/sh
 
 sleep 2
+# отдельные базы комментариев и подписок, сессий (см. DATABASE_MODELS)
+if [ "$DB_SOCIAL" ]; then
+  python manage.py migrate --database social
+fi
+if [ "$DB_SESSIONS" ]; then
+  python manage.py migrate --database sessions
+fi
 python manage.py migrate
 python manage.py createcachetable
+# старые аккаунты, чьи страницы закрыли новые адреса сайта: переименовать в админке
+python manage.py shadowed_usernames || true
 
 if [ "$DJANGO_SUPERUSER_USERNAME" ]; then
   python manage.py createsuperuser \
@@ -12,6 +21,16 @@ if [ "$DJANGO_SUPERUSER_USERNAME" ]; then
 fi
 
 python manage.py collectstatic --noinput
-gunicorn yatube.wsgi:application --bind 0.0.0.0:8000
+
+# прогрев кэша после старта: WARM_CACHES=1 (WARM_CACHES_HOST — домен сайта)
+if [ "$WARM_CACHES" = "1" ]; then
+  (
+    sleep 5
+    python manage.py warm_caches --host "${WARM_CACHES_HOST:-localhost}" || true
+  ) &
+fi
+
+# потоки: живые уведомления (posts/live.py) держат поток на соединение
+gunicorn yatube.wsgi:application --bind 0.0.0.0:8000 --threads 16
 
 exec "$@"
@@ -1,9 +1,26 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.utils.text import capfirst
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, Post, User, protected_relations
+from .search import search_posts
 
 
-class PostAdmin(admin.ModelAdmin):
+class ProtectedRelationsMixin:
+    """Lists the comments and follows blocking a deletion, like ``PROTECT``."""
+
+    def get_deleted_objects(self, objs, request):
+        deleted, model_count, perms_needed, protected = super().get_deleted_objects(
+            objs, request
+        )
+        for obj in objs:
+            for related, field in protected_relations(obj):
+                verbose_name = capfirst(related.model._meta.verbose_name)
+                protected.extend(f"{verbose_name}: {item}" for item in related)
+        return deleted, model_count, perms_needed, protected
+
+
+class PostAdmin(ProtectedRelationsMixin, admin.ModelAdmin):
     list_display = (
         "pk",
         "text",
@@ -15,6 +32,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # вместо LIKE '%...%' по всей таблице — полнотекстовый индекс
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -35,15 +58,32 @@ class FollowAdmin(admin.ModelAdmin):
     )
     search_fields = ("user",)
     empty_value_display = "-пусто-"
+    # подписки могут лежать в отдельной базе, JOIN с пользователями невозможен
+    list_select_related = ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("user", "author")
 
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ("post", "author", "text", "created")
     search_fields = ("text",)
     empty_value_display = "-пусто-"
+    # как и подписки, комментарии могут лежать в отдельной базе
+    list_select_related = ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("post", "author")
+
+
+class ProtectedUserAdmin(ProtectedRelationsMixin, UserAdmin):
+    pass
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Comment, CommentAdmin)
+# импорт django.contrib.auth.admin выше уже зарегистрировал UserAdmin
+admin.site.unregister(User)
+admin.site.register(User, ProtectedUserAdmin)
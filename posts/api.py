@@ -0,0 +1,173 @@
+"""Read-only JSON API: the feeds and single posts with their comments.
+
+Lists are paged by cursor over ``(pub_date, id)``: ``next``/``previous``
+hold ready links with ``?before=``/``?after=``. ``?fields=id,text`` selects
+only the listed columns. Rows go from ``values()`` straight into the JSON,
+without model instances, and every response takes a fixed number of queries
+whatever the page holds.
+"""
+
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from . import caching
+from .models import Comment, Group, Post, TimelineEntry, User
+from .paginators import PAGE_SIZE, CursorPaginator, InvalidCursor
+
+# имя поля в ответе -> столбец для values()
+POST_COLUMNS = {
+    "id": "id",
+    "text": "text",
+    "pub_date": "pub_date",
+    "author": "author__username",
+    "group": "group__slug",
+    "image": "image",
+    "comment_count": "comment_count",
+}
+# в ленте подписок id и дата поста хранятся в самой записи ленты
+TIMELINE_COLUMNS = {
+    **{name: f"post__{column}" for name, column in POST_COLUMNS.items()},
+    "id": "post_id",
+    "pub_date": "pub_date",
+}
+
+_image_url = Post._meta.get_field("image").storage.url
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({"detail": message}, status=status)
+
+
+def _login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error("Нужно войти", status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _fields(request, allowed):
+    names = [name for name in request.GET.get("fields", "").split(",") if name]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise InvalidFields(f"Неизвестные поля: {', '.join(unknown)}")
+    return names or list(allowed)
+
+
+def _row(values, names, columns):
+    row = {name: values[columns[name]] for name in names}
+    if "image" in row:
+        row["image"] = _image_url(row["image"]) if row["image"] else None
+    return row
+
+
+def _link(request, param, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop("before", None)
+    query.pop("after", None)
+    query[param] = cursor
+    return request.build_absolute_uri(f"?{query.urlencode()}")
+
+
+def _feed(request, queryset, columns=POST_COLUMNS, keys=("pub_date", "id")):
+    try:
+        names = _fields(request, columns)
+        selected = {columns[name] for name in names} | set(keys)
+        paginator = CursorPaginator(queryset.values(*selected), PAGE_SIZE, keys)
+        page = paginator.page(
+            before=request.GET.get("before"), after=request.GET.get("after")
+        )
+    except (InvalidFields, InvalidCursor) as error:
+        return _error(str(error))
+    return JsonResponse(
+        {
+            "results": [_row(values, names, columns) for values in page],
+            "next": _link(request, "before", page.next_cursor),
+            "previous": _link(request, "after", page.previous_cursor),
+        }
+    )
+
+
+@require_safe
+@caching.conditional(lambda request: [caching.INDEX])
+def index(request):
+    return _feed(request, Post.objects.all())
+
+
+@require_safe
+@caching.conditional(lambda request, slug: [caching.group_scope(slug)])
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only("pk"), slug=slug)
+    return _feed(request, Post.objects.filter(group_id=group.pk))
+
+
+@require_safe
+@caching.conditional(lambda request, username: [caching.profile_scope(username)])
+def profile(request, username):
+    author = get_object_or_404(User.objects.only("pk"), username=username)
+    return _feed(request, Post.objects.filter(author_id=author.pk))
+
+
+@require_safe
+@_login_required
+@caching.conditional(
+    lambda request: [caching.INDEX, caching.follow_scope(request.user.pk)]
+)
+def follow_index(request):
+    entries = TimelineEntry.objects.filter(user_id=request.user.pk)
+    return _feed(request, entries, TIMELINE_COLUMNS, ("pub_date", "post_id"))
+
+
+@require_safe
+@caching.conditional(
+    lambda request, username, post_id: [caching.profile_scope(username)]
+)
+def post_view(request, username, post_id):
+    try:
+        names = _fields(request, [*POST_COLUMNS, "comments"])
+    except InvalidFields as error:
+        return _error(str(error))
+    columns = [POST_COLUMNS[name] for name in names if name != "comments"]
+    values = (
+        Post.objects.filter(pk=post_id, author__username=username)
+        .values("id", *columns)
+        .first()
+    )
+    if values is None:
+        return _error("Пост не найден", status=404)
+    post = _row(values, [name for name in names if name != "comments"], POST_COLUMNS)
+    if "comments" in names:
+        # комментарии могут жить в отдельной базе: авторов берём вторым запросом
+        comments = list(
+            Comment.objects.filter(post_id=post_id).values(
+                "id", "author_id", "text", "created"
+            )
+        )
+        authors = {}
+        if comments:
+            authors = dict(
+                User.objects.filter(
+                    pk__in={comment["author_id"] for comment in comments}
+                ).values_list("pk", "username")
+            )
+        post["comments"] = [
+            {
+                "id": comment["id"],
+                "author": authors.get(comment["author_id"]),
+                "text": comment["text"],
+                "created": comment["created"],
+            }
+            for comment in comments
+        ]
+    return JsonResponse(post)
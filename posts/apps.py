@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = "posts"
+
+    def ready(self):
+        # регистрируем обработчики сигналов
+        from yatube import sqlite  # noqa
+
+        from . import signals  # noqa
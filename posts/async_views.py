@@ -0,0 +1,249 @@
+"""Async variants of the feed views, served with ``ASYNC_VIEWS=1`` under ASGI.
+
+Django 3.2 has no async ORM yet (``aget``, ``acount`` and ``async for``
+came in 4.1), so ORM calls run in worker threads via ``sync_to_async``,
+each thread with its own connection. Queries that do not depend on each
+other — the page of posts and the list size, the follow status and the
+profile stats, a post and its comments — are awaited together with
+``asyncio.gather``. While they wait, the event loop serves other requests
+instead of blocking a whole worker.
+
+The output is the same as in ``posts.views``, and so are the cache keys.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.shortcuts import get_object_or_404, render
+
+from . import caching, counters
+from .forms import CommentForm
+from .models import Comment, Follow, Group, Post, TimelineEntry, User
+from .paginators import (
+    NUMBERED_PAGES,
+    PAGE_SIZE,
+    CachedCountPaginator,
+    CursorPaginator,
+    add_links,
+    cursor_after_numbered,
+    page_number,
+)
+
+# синхронные декораторы ждут своё представление, занимая поток на весь запрос;
+# у них свой пул, иначе они займут все потоки, нужные запросам к базе
+DECORATOR_THREADS = 64
+_decorator_executor = ThreadPoolExecutor(
+    DECORATOR_THREADS, thread_name_prefix="view-decorators"
+)
+
+
+def _in_thread(function, args, kwargs, executor=None):
+    def call():
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # как после запроса: соединение потока закрывается по CONN_MAX_AGE
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False, executor=executor)()
+
+
+def _db(function, *args, **kwargs):
+    """Run ORM code in a worker thread, concurrently with other such calls."""
+    return _in_thread(function, args, kwargs)
+
+
+def async_aware(decorate):
+    """Let a sync view decorator wrap an async view.
+
+    The decorator's own code (cache lookups, login checks) runs in a worker
+    thread, the view itself stays on the event loop. Django 3.2 opens no
+    ``ThreadSensitiveContext`` per request, so a thread-sensitive call would
+    hold the one shared sync thread until the response is ready and the
+    views would run one at a time. So it runs in ``_decorator_executor``
+    instead, apart from the threads of the queries.
+    """
+
+    def decorator(view):
+        sync_view = decorate(async_to_sync(view))
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            return await _in_thread(
+                sync_view, (request, *args), kwargs, _decorator_executor
+            )
+
+        return wrapper
+
+    return decorator
+
+
+async def _render(request, template_name, context):
+    return await _db(render, request, template_name, context)
+
+
+async def paginate(request, object_list, keys=("pub_date", "id"), count_key=None):
+    """``posts.paginators.paginate`` with the count and the items fetched at once."""
+    before = request.GET.get("before")
+    after = request.GET.get("after")
+    number = page_number(request)
+    if not (before or after) and number > NUMBERED_PAGES:
+        before = await _db(cursor_after_numbered, object_list, keys)
+    if before or after:
+        paginator = CursorPaginator(object_list, PAGE_SIZE, keys)
+        return paginator, await _db(paginator.get_page, before=before, after=after)
+
+    paginator = CachedCountPaginator(object_list, PAGE_SIZE, count_key=count_key)
+    bottom = (number - 1) * PAGE_SIZE
+    _, items = await asyncio.gather(
+        _db(lambda: paginator.count),
+        _db(list, object_list[bottom : bottom + PAGE_SIZE]),
+    )
+    if not items and number > 1:
+        # как Paginator.get_page: за пределами списка — последняя страница
+        number = paginator.num_pages
+        bottom = (number - 1) * PAGE_SIZE
+        items = await _db(list, object_list[bottom : bottom + PAGE_SIZE])
+    page = paginator._get_page(items, number, paginator)
+    add_links(paginator, page, keys)
+    return paginator, page
+
+
+@async_aware(caching.cache_page_versioned("index_page", lambda: [caching.INDEX]))
+async def index(request):
+    post_list = Post.objects.select_related("author", "group").all()
+    paginator, page = await paginate(request, post_list, count_key=counters.INDEX)
+    return await _render(
+        request,
+        "posts/index.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": await _db(caching.get_cards, page),
+        },
+    )
+
+
+@async_aware(
+    caching.cache_page_versioned("group_page", lambda slug: [caching.group_scope(slug)])
+)
+async def group_posts(request, slug):
+    group = await _db(get_object_or_404, Group, slug=slug)
+    posts = group.group_posts.select_related("author", "group").all()
+    paginator, page = await paginate(
+        request, posts, count_key=counters.group_key(group.pk)
+    )
+    return await _render(
+        request,
+        "posts/group.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": await _db(caching.get_cards, page),
+            "group": group,
+        },
+    )
+
+
+def _following(request, author):
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    return Follow.objects.filter(user=user, author=author).exists()
+
+
+@async_aware(
+    caching.cache_page_versioned(
+        "profile_page", lambda username: [caching.profile_scope(username)]
+    )
+)
+async def profile(request, username):
+    author = await _db(
+        get_object_or_404, User.objects.select_related("stats"), username=username
+    )
+    posts = author.posts.select_related("author", "group").all()
+    (paginator, page), following, stats = await asyncio.gather(
+        paginate(request, posts, count_key=counters.author_key(author.pk)),
+        _db(_following, request, author),
+        _db(counters.profile_stats, author),
+    )
+    return await _render(
+        request,
+        "posts/profile.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": await _db(caching.get_cards, page),
+            "author": author,
+            "stats": stats,
+            "following": following,
+        },
+    )
+
+
+@async_aware(
+    caching.conditional(
+        lambda request, username, post_id: [caching.profile_scope(username)]
+    )
+)
+async def post_view(request, username, post_id):
+    post, comments = await asyncio.gather(
+        _db(
+            get_object_or_404,
+            Post.objects.select_related("author__stats", "group"),
+            pk=post_id,
+            author__username=username,
+        ),
+        # комментарии могут жить в отдельной базе: без JOIN с постом
+        _db(list, Comment.objects.filter(post_id=post_id).prefetch_related("author")),
+    )
+    return await _render(
+        request,
+        "posts/post.html",
+        {
+            "post": post,
+            "author": post.author,
+            "stats": await _db(counters.profile_stats, post.author),
+            "form": CommentForm(),
+            "items": comments,
+        },
+    )
+
+
+def _follow_decorators(view):
+    # оба декоратора — одним слоем: вложенные async_aware ждали бы друг друга
+    # в общем пуле и при DECORATOR_THREADS запросах заняли бы его целиком
+    return login_required(
+        caching.conditional(
+            lambda request: [caching.INDEX, caching.follow_scope(request.user.pk)]
+        )(view)
+    )
+
+
+@async_aware(_follow_decorators)
+async def follow_index(request):
+    logged = request.user
+    entries = TimelineEntry.objects.filter(user=logged).select_related(
+        "post__author", "post__group"
+    )
+    paginator, page = await paginate(
+        request,
+        entries,
+        keys=("pub_date", "post_id"),
+        count_key=counters.follow_key(logged.pk),
+    )
+    page.object_list = [entry.post for entry in page.object_list]
+    return await _render(
+        request,
+        "posts/follow.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": await _db(caching.get_cards, page),
+            "username": logged,
+        },
+    )
@@ -0,0 +1,265 @@
+"""Version-keyed page caching.
+
+Every cached page belongs to one or more scopes (``index``, ``group:<slug>``,
+``profile:<username>``). A scope has a generation stamp in the cache; the
+page key includes the stamps, so bumping a scope on a write makes all of
+its pages miss at once while untouched pages keep living for hours.
+"""
+
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils.cache import patch_response_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from yatube.routers import use_primary
+
+from .models import Group, Post, User
+
+# общий для всех страниц: меняется, например, при правке группы
+GLOBAL = "all"
+INDEX = "index"
+# сколько живут страницы в кэше: устаревают они по событиям, а не по времени
+PAGE_TIMEOUT = 60 * 60 * 6
+# устаревшую страницу ещё можно отдать, пока другой запрос считает новую
+STALE_TIMEOUT = 60 * 10
+# сколько один запрос может держать блокировку пересчёта страницы
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+# β из XFetch: больше — раньше начинается упреждающее обновление
+EARLY_REFRESH_BETA = 1.0
+
+
+bumped = Signal()
+
+
+def group_scope(slug):
+    return f"group:{slug}"
+
+
+def profile_scope(username):
+    return f"profile:{username}"
+
+
+def follow_scope(user_id):
+    return f"follow:{user_id}"
+
+
+def _generation_key(scope):
+    return f"generation:{scope}"
+
+
+def generation_stamps(*scopes):
+    """Current generation stamps of the scopes, by scope."""
+    keys = {scope: _generation_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    for key in keys.values():
+        if key not in found:
+            # счётчик вытеснен или ещё не создан: новый штамп, а не ноль,
+            # чтобы не совпасть со старыми записями
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return {scope: found[key] for scope, key in keys.items()}
+
+
+def generations(*scopes):
+    """Current generation stamps of the scopes, as a cache key fragment."""
+    return "-".join(str(stamp) for stamp in generation_stamps(*scopes).values())
+
+
+def bump(*scopes):
+    """Invalidate every cached page of the given scopes.
+
+    The new stamps are written once the transaction commits: a page
+    rendered before that still reads the old data, and must not be cached
+    under the new stamps. Then ``bumped`` tells this process's listeners
+    (the live notifications in ``posts.live``) which scopes have changed.
+    """
+
+    def commit():
+        stamp = time.time_ns()
+        cache.set_many({_generation_key(scope): stamp for scope in scopes}, None)
+        bumped.send(sender=None, scopes=scopes)
+
+    transaction.on_commit(commit)
+
+
+def bump_profiles(*user_ids):
+    usernames = User.objects.filter(pk__in=user_ids).values_list("username", flat=True)
+    bump(*[profile_scope(username) for username in usernames])
+
+
+def bump_post(author_id, *group_ids):
+    """Invalidate the pages showing a post: index, author profile, groups."""
+    usernames = User.objects.filter(pk=author_id).values_list("username", flat=True)
+    slugs = Group.objects.filter(pk__in=[pk for pk in group_ids if pk]).values_list(
+        "slug", flat=True
+    )
+    bump(
+        INDEX,
+        *[profile_scope(username) for username in usernames],
+        *[group_scope(slug) for slug in slugs],
+    )
+
+
+def bump_comment(post_id):
+    post = Post.objects.filter(pk=post_id).values("author_id", "group_id").first()
+    if post is not None:
+        bump_post(post["author_id"], post["group_id"])
+
+
+def card_key(post, stamp=None):
+    """Cache key of a rendered post card; changes with any visible edit."""
+    if stamp is None:
+        stamp = generations(GLOBAL)
+    version = f"{post.updated.timestamp()}.{post.comment_count}"
+    return f"post_card:{post.pk}:{version}:{stamp}"
+
+
+def get_cards(posts):
+    """Look up the cached cards of a page in a single multi-get.
+
+    Returns ``{post id: (key, html or None)}`` for the ``post_card`` tag.
+    """
+    stamp = generations(GLOBAL)
+    keys = {post.pk: card_key(post, stamp) for post in posts}
+    found = cache.get_many(list(keys.values()))
+    return {pk: (key, found.get(key)) for pk, key in keys.items()}
+
+
+def _user(request):
+    return request.user.pk if request.user.is_authenticated else "anon"
+
+
+def page_key(request, key_prefix):
+    """Cache key of a page for the current user (stamps are kept inside)."""
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"page:{key_prefix}:{_user(request)}:{url}"
+
+
+def _etag(request, stamps):
+    # страница зависит и от пользователя: ссылки на правку, форма комментария
+    return hashlib.md5(f"{_user(request)}:{stamps}".encode()).hexdigest()
+
+
+def _last_modified(stamps):
+    latest = max(int(stamp) for stamp in stamps.split("-"))
+    return datetime.fromtimestamp(latest / 10**9, tz=timezone.utc)
+
+
+def conditional(scopes=lambda request, *args, **kwargs: ()):
+    """Answer ``If-None-Match``/``If-Modified-Since`` from the scope stamps.
+
+    ``scopes`` receives the request and the view arguments. The validators
+    only need the stamps, so a 304 costs no queries and no rendering. The
+    200 responses are read from the primary database.
+    """
+
+    def etag(request, *args, **kwargs):
+        return _etag(request, generations(GLOBAL, *scopes(request, *args, **kwargs)))
+
+    def last_modified(request, *args, **kwargs):
+        return _last_modified(generations(GLOBAL, *scopes(request, *args, **kwargs)))
+
+    def decorator(view):
+        @wraps(view)
+        def primary(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            # валидаторы — от новых штампов: отставшая реплика отдала бы
+            # под ними старое тело, и на него отвечали бы 304 до новой записи
+            with use_primary():
+                return view(request, *args, **kwargs)
+
+        return condition(etag_func=etag, last_modified_func=last_modified)(primary)
+
+    return decorator
+
+
+def _expired(entry, now):
+    """XFetch: refresh early, the closer to expiry the likelier.
+
+    The longer the page took to render, the earlier a refresh may start.
+    """
+    jitter = -entry["delta"] * EARLY_REFRESH_BETA * math.log(1 - random.random())
+    return now + jitter >= entry["fresh_until"]
+
+
+def cache_page_versioned(key_prefix, scopes=lambda *args, **kwargs: ()):
+    """Like ``cache_page``, but entries expire when their scopes are bumped.
+
+    ``scopes`` receives the view arguments and returns the scopes of the
+    page besides ``GLOBAL``. Pages are cached per user, and clients are
+    told to revalidate (``max-age=0``) instead of trusting a fixed TTL.
+    The pages that go to the cache are rendered from the primary database.
+
+    Concurrent misses are coalesced with a lock in the cache (``add`` is
+    atomic in the shared tier, so it works across workers): one request
+    renders the page while the others serve the previous version, or wait
+    for the new one when there is nothing to serve yet.
+    """
+
+    def decorator(view):
+        def render(request, key, stamps, args, kwargs):
+            started = time.monotonic()
+            # с основной базы (см. conditional): страница ляжет в кэш под
+            # новыми штампами на часы
+            response = view(request, *args, **kwargs)
+            patch_response_headers(response, 0)
+            if response.status_code == 200 and not response.streaming:
+                # валидаторы той версии, что лежит в кэше: устаревшая
+                # страница, отданная во время пересчёта, не получит новый ETag
+                response["ETag"] = quote_etag(_etag(request, stamps))
+                response["Last-Modified"] = http_date(
+                    _last_modified(stamps).timestamp()
+                )
+                entry = {
+                    "stamps": stamps,
+                    "response": response,
+                    "fresh_until": time.time() + PAGE_TIMEOUT,
+                    "delta": time.monotonic() - started,
+                }
+                cache.set(key, entry, PAGE_TIMEOUT + STALE_TIMEOUT)
+            return response
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            stamps = generations(GLOBAL, *scopes(*args, **kwargs))
+            key = page_key(request, key_prefix)
+            lock = f"{key}:lock"
+            entry = cache.get(key)
+            if entry is not None:
+                fresh = entry["stamps"] == stamps
+                if fresh and not _expired(entry, time.time()):
+                    return entry["response"]
+                if not cache.add(lock, 1, LOCK_TIMEOUT):
+                    # страницу уже пересчитывает другой запрос
+                    return entry["response"]
+            elif not cache.add(lock, 1, LOCK_TIMEOUT):
+                deadline = time.monotonic() + LOCK_TIMEOUT
+                while time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL_INTERVAL)
+                    entry = cache.get(key)
+                    if entry is not None and entry["stamps"] == stamps:
+                        return entry["response"]
+                return render(request, key, stamps, args, kwargs)
+            try:
+                return render(request, key, stamps, args, kwargs)
+            finally:
+                cache.delete(lock)
+
+        return conditional(lambda request, *args, **kwargs: scopes(*args, **kwargs))(
+            wrapper
+        )
+
+    return decorator
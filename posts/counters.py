@@ -0,0 +1,142 @@
+"""Denormalized counters.
+
+Rows of ``PostCounter`` (list sizes for paginators) are dropped once a
+transaction that moves a post into or out of a list commits, and are lazily
+recomputed by the next ``CachedCountPaginator`` that needs them.
+``Post.comment_count`` and ``ProfileStats`` are kept in sync with atomic
+``F()`` updates.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, PostCounter, ProfileStats
+
+User = get_user_model()
+
+INDEX = "index"
+
+
+def group_key(group_id):
+    return f"group:{group_id}"
+
+
+def author_key(author_id):
+    return f"author:{author_id}"
+
+
+def follow_key(user_id):
+    return f"follow:{user_id}"
+
+
+def invalidate(*keys):
+    # удаляем после коммита: иначе параллельный запрос успеет пересчитать
+    # размер по старым данным и сохранить его до конца транзакции
+    transaction.on_commit(lambda: PostCounter.objects.filter(key__in=keys).delete())
+
+
+def invalidate_post(post, follower_ids=None):
+    """Forget every list count the post is part of."""
+    if follower_ids is None:
+        follower_ids = Follow.objects.filter(author_id=post.author_id).values_list(
+            "user_id", flat=True
+        )
+    keys = [INDEX, author_key(post.author_id)]
+    keys += [follow_key(user_id) for user_id in follower_ids]
+    if post.group_id is not None:
+        keys.append(group_key(post.group_id))
+    invalidate(*keys)
+
+
+def invalidate_groups(*group_ids):
+    invalidate(*[group_key(group_id) for group_id in group_ids if group_id])
+
+
+def comment_added(post_id):
+    Post.objects.filter(pk=post_id).update(comment_count=F("comment_count") + 1)
+
+
+def comment_removed(post_id):
+    Post.objects.filter(pk=post_id, comment_count__gt=0).update(
+        comment_count=F("comment_count") - 1
+    )
+
+
+def reconcile_comment_counts():
+    """Fix drifted ``Post.comment_count`` values, return how many were wrong."""
+    actual = dict(
+        Comment.objects.order_by()
+        .values("post_id")
+        .annotate(total=Count("pk"))
+        .values_list("post_id", "total")
+    )
+    drifted = []
+    for post in Post.objects.only("pk", "comment_count").iterator():
+        total = actual.get(post.pk, 0)
+        if post.comment_count != total:
+            post.comment_count = total
+            drifted.append(post)
+    Post.objects.bulk_update(drifted, ["comment_count"], batch_size=500)
+    return len(drifted)
+
+
+def _totals(queryset, field):
+    return dict(
+        queryset.order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values_list(field, "total")
+    )
+
+
+def recompute_profile_stats(user_ids=None):
+    """Recount ``ProfileStats`` rows for the given users (or everybody)."""
+    follows = Follow.objects.all()
+    posts = Post.objects.all()
+    users = User.objects.all()
+    if user_ids is not None:
+        follows_in = follows.filter(author_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+        posts = posts.filter(author_id__in=user_ids)
+        users = users.filter(pk__in=user_ids)
+    else:
+        follows_in = follows
+    followers = _totals(follows_in, "author_id")
+    following = _totals(follows, "user_id")
+    written = _totals(posts, "author_id")
+    user_ids = list(users.values_list("pk", flat=True))
+    with transaction.atomic():
+        ProfileStats.objects.filter(user_id__in=user_ids).delete()
+        ProfileStats.objects.bulk_create(
+            [
+                ProfileStats(
+                    user_id=user_id,
+                    followers=followers.get(user_id, 0),
+                    following=following.get(user_id, 0),
+                    posts=written.get(user_id, 0),
+                )
+                for user_id in user_ids
+            ],
+            batch_size=500,
+        )
+    return len(user_ids)
+
+
+def bump_profile_stats(user_id, field, delta):
+    """Atomically add ``delta`` to one counter of the user's stats row."""
+    stats = ProfileStats.objects.filter(pk=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f"{field}__gte": -delta})
+    if not stats.update(**{field: F(field) + delta}) and delta > 0:
+        # строки ещё нет — пересчитываем целиком
+        recompute_profile_stats([user_id])
+
+
+def profile_stats(user):
+    """Stats row of the user, created on first access."""
+    try:
+        return user.stats
+    except ProfileStats.DoesNotExist:
+        recompute_profile_stats([user.pk])
+        return ProfileStats.objects.get(pk=user.pk)
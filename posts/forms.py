@@ -1,6 +1,10 @@
+from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
-from .models import Comment, Post
+from . import uploads
+from .models import Comment, Group, Post
+from .search import search_posts
 
 
 class PostForm(ModelForm):  # extending ModelForm, not Form as before
@@ -18,6 +22,22 @@ class PostForm(ModelForm):  # extending ModelForm, not Form as before
             "image": "Выберите изображение для поста",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if getattr(self.files.get("image"), "too_large", False):
+            # обрезанный обработчиком загрузки файл Pillow может не прочесть
+            self.fields["image"].error_messages[
+                "invalid_image"
+            ] = uploads.too_large_message()
+
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        if not isinstance(image, UploadedFile):
+            # картинку не меняли
+            return image
+        uploads.validate_image(image)
+        return uploads.normalize(image)
+
 
 class CommentForm(ModelForm):  # extending ModelForm, not Form as before
     class Meta:
@@ -25,3 +45,24 @@ class CommentForm(ModelForm):  # extending ModelForm, not Form as before
         fields = ["text"]
         help_texts = {"text": "Напишите комментарий"}
         labels = {"text": "Текст вашего комментария"}
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label="Что ищем", max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        to_field_name="slug",
+        required=False,
+        label="В группе",
+        empty_label="Все группы",
+    )
+    author = forms.CharField(label="Автор", max_length=150, required=False)
+
+    def search(self):
+        """Matching posts, best first; the form must be valid."""
+        posts = Post.objects.select_related("author", "group")
+        if self.cleaned_data["group"]:
+            posts = posts.filter(group=self.cleaned_data["group"])
+        if self.cleaned_data["author"]:
+            posts = posts.filter(author__username=self.cleaned_data["author"])
+        return search_posts(posts, self.cleaned_data["q"])
@@ -0,0 +1,230 @@
+"""Live "N new posts" notifications over server-sent events.
+
+A stream counts the posts of a feed above a cursor (``?since=``, usually the
+top post of the page the reader sees) and sends the number whenever it
+changes. What wakes the streams up are the page-cache scopes of
+``posts.caching``:
+
+* writes in this process reach the in-process ``broker`` right after their
+  transaction commits (``caching.bumped``);
+* writes in other workers are found by polling the scopes' generation
+  stamps in the shared cache, once per ``POLL_INTERVAL`` for the whole
+  process whatever the number of streams.
+
+A subscription is a single flag, so bursts of posts coalesce instead of
+queueing up, and a stream holds nothing but its cursor and the last count
+sent. Django 3.2 runs streaming responses in a worker thread under WSGI and
+ASGI alike, so each process serves at most ``MAX_STREAMS`` streams and every
+stream ends after ``STREAM_DURATION``; ``EventSource`` then reconnects by
+itself, sending the cursor back in ``Last-Event-ID``.
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from yatube.routers import use_primary
+
+from . import caching
+from .models import Group, Post, TimelineEntry
+from .paginators import CursorPaginator, InvalidCursor, decode_cursor
+
+# потоков на процесс: каждый держит рабочий поток сервера
+MAX_STREAMS = 8
+# через сколько секунд поток закрывается и браузер переподключается
+STREAM_DURATION = 60
+# как часто процесс проверяет штампы в общем кэше (записи других воркеров)
+POLL_INTERVAL = 2
+# комментарий-пинг в тишине: держит соединение и замечает ушедших клиентов
+HEARTBEAT_INTERVAL = 15
+# пауза перед переподключением, мс; когда мест нет — подольше
+RETRY = 1000
+BUSY_RETRY = 30000
+# больше новых записей не считаем: «99+»
+MAX_COUNT = 99
+
+
+class Subscription:
+    """A stream's interest in a few scopes: set when any of them changes."""
+
+    def __init__(self, broker, scopes):
+        self.broker = broker
+        self.scopes = scopes
+        self._changed = threading.Event()
+
+    def notify(self):
+        self._changed.set()
+
+    def wait(self, timeout):
+        """Wait for a change; ``False`` if none came within ``timeout``."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = max(min(POLL_INTERVAL, deadline - time.monotonic()), 0)
+            if self._changed.wait(remaining):
+                self._changed.clear()
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            self.broker.poll()
+
+
+class Broker:
+    """In-process pub/sub of page-cache scopes with a shared-cache fallback."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        # штамп каждой области, который процесс видел последним
+        self._stamps = {}
+        self._polled_at = 0
+
+    def subscribe(self, scopes):
+        subscription = Subscription(self, scopes)
+        with self._lock:
+            unseen = [scope for scope in scopes if scope not in self._stamps]
+        # штамп запоминаем до первого подсчёта: изменение между ними не потеряется
+        stamps = caching.generation_stamps(*unseen) if unseen else {}
+        with self._lock:
+            for scope in scopes:
+                self._stamps.setdefault(scope, stamps.get(scope))
+                self._subscriptions[scope].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for scope in subscription.scopes:
+                subscriptions = self._subscriptions[scope]
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[scope]
+                    del self._stamps[scope]
+
+    def publish(self, scopes):
+        with self._lock:
+            subscriptions = set()
+            for scope in scopes:
+                subscriptions.update(self._subscriptions.get(scope, ()))
+        for subscription in subscriptions:
+            subscription.notify()
+
+    def poll(self):
+        """Pick up the writes of other workers from the shared cache.
+
+        Only one stream of the process polls per ``POLL_INTERVAL``, for all
+        the subscribed scopes at once.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._polled_at < POLL_INTERVAL or not self._subscriptions:
+                return
+            self._polled_at = now
+            scopes = list(self._subscriptions)
+        stamps = caching.generation_stamps(*scopes)
+        with self._lock:
+            changed = [
+                scope
+                for scope, stamp in stamps.items()
+                if scope in self._stamps and self._stamps[scope] != stamp
+            ]
+            for scope in changed:
+                self._stamps[scope] = stamps[scope]
+        self.publish(changed)
+
+
+broker = Broker()
+_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+@receiver(caching.bumped)
+def scopes_bumped(sender, scopes, **kwargs):
+    broker.publish(scopes)
+
+
+def _event(name, data, event_id):
+    return f"event: {name}\nid: {event_id}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream(scopes, paginator, since):
+    if not _streams.acquire(blocking=False):
+        yield f"retry: {BUSY_RETRY}\n\n"
+        return
+    subscription = broker.subscribe(scopes)
+    try:
+        yield f"retry: {RETRY}\n\n"
+        deadline = time.monotonic() + STREAM_DURATION
+        changed = True
+        last = None
+        while True:
+            if changed:
+                # генератор живёт вне запроса; отставшая реплика не увидела бы
+                # новую запись, и о ней не сообщили бы до следующей
+                with use_primary():
+                    count = paginator.count_newer(since, MAX_COUNT + 1)
+                if count != last:
+                    data = {"count": min(count, MAX_COUNT), "more": count > MAX_COUNT}
+                    yield _event("posts", data, since or "")
+                    last = count
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            changed = subscription.wait(min(HEARTBEAT_INTERVAL, remaining))
+            if not changed:
+                yield ": ping\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+        _streams.release()
+
+
+def _live(request, scopes, queryset, keys=("pub_date", "id")):
+    paginator = CursorPaginator(queryset, 1, keys)
+    # после переподключения курсор возвращается в Last-Event-ID
+    since = request.headers.get("Last-Event-ID") or request.GET.get("since")
+    if since:
+        try:
+            decode_cursor(since)
+        except InvalidCursor as error:
+            return HttpResponseBadRequest(str(error))
+    else:
+        # без курсора новыми считаются записи, появившиеся после подключения
+        with use_primary():
+            newest = paginator.object_list.values(*keys).first()
+        since = newest and paginator.cursor_for(newest)
+    response = StreamingHttpResponse(
+        _stream(scopes, paginator, since), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx не должен копить события в буфере
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_safe
+def index(request):
+    return _live(request, [caching.INDEX], Post.objects.all())
+
+
+@require_safe
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only("pk"), slug=slug)
+    return _live(
+        request, [caching.group_scope(slug)], Post.objects.filter(group_id=group.pk)
+    )
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    # лента подписок меняется с любой новой записью (как и её страница)
+    return _live(
+        request,
+        [caching.INDEX, caching.follow_scope(request.user.pk)],
+        TimelineEntry.objects.filter(user_id=request.user.pk),
+        ("pub_date", "post_id"),
+    )
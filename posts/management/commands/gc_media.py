@@ -0,0 +1,69 @@
+import os
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import Post
+
+
+def walk(storage, path):
+    """Names of all files under ``path`` in the storage."""
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        yield posixpath.join(path, filename)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = "Delete post images and thumbnails that no post refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="Keep files changed less than this many hours ago (default: 24)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the files that would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        # свежие файлы могут принадлежать посту, который ещё сохраняется
+        cutoff = timezone.now() - timedelta(hours=options["min_age"])
+        images = set(
+            Post.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .values_list("image", flat=True)
+        )
+        stems = {os.path.splitext(name)[0] for name in images}
+        storage = Post._meta.get_field("image").storage
+
+        garbage = [
+            (storage, name) for name in walk(storage, "posts") if name not in images
+        ]
+        # превью: thumbnails/<имя картинки без расширения>_<ш>x<в>.<формат>
+        garbage += [
+            (default_storage, name)
+            for name in walk(default_storage, "thumbnails/posts")
+            if name[len("thumbnails/") :].rsplit("_", 1)[0] not in stems
+        ]
+        removed = 0
+        for file_storage, name in garbage:
+            if file_storage.get_modified_time(name) > cutoff:
+                continue
+            self.stdout.write(name)
+            if not options["dry_run"]:
+                file_storage.delete(name)
+            removed += 1
+        action = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{action} {removed} file(s)"))
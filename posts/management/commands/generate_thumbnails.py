@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Build card thumbnails for posts whose images have none yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild thumbnails of every post with an image",
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            posts = posts.filter(thumbnails={})
+        total = 0
+        for post_id in posts.values_list("pk", flat=True).iterator():
+            if thumbnails.generate(post_id, options["all"]) is not None:
+                total += 1
+        self.stdout.write(self.style.SUCCESS(f"Built thumbnails of {total} post(s)"))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized follow timelines from existing Follow rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Rebuild only these users' timelines (default: everybody)",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["usernames"]:
+            user_ids = list(
+                User.objects.filter(username__in=options["usernames"]).values_list(
+                    "pk", flat=True
+                )
+            )
+        follows = timeline.rebuild(user_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f"Timelines rebuilt from {follows} follow(s)")
+        )
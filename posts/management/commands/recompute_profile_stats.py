@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Recompute followers/following/posts statistics of user profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Recompute only these users (default: everybody)",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["usernames"]:
+            user_ids = list(
+                User.objects.filter(username__in=options["usernames"]).values_list(
+                    "pk", flat=True
+                )
+            )
+        total = counters.recompute_profile_stats(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {total} profile(s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = "Recount Post.comment_count from the comments table and fix drift"
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile_comment_counts()
+        self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} post(s)"))
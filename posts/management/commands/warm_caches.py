@@ -0,0 +1,99 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group, Post, ProfileStats
+from posts.paginators import PAGE_SIZE
+
+
+class Command(BaseCommand):
+    help = "Pre-render hot pages (index, groups, top profiles) into the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=3,
+            help="How many index pages to render (default: 3)",
+        )
+        parser.add_argument(
+            "--profiles",
+            type=int,
+            default=20,
+            help="How many of the most-followed profiles to render (default: 20)",
+        )
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="Host the pages are requested for; cache keys depend on it",
+        )
+        parser.add_argument(
+            "--secure",
+            action="store_true",
+            help="Request pages over https (when served behind a TLS proxy)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of parallel render threads (default: 4)",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=30,
+            help="Stop starting new renders after this many seconds",
+        )
+
+    def urls(self, pages, profiles):
+        pages = min(pages, math.ceil(Post.objects.count() / PAGE_SIZE)) or 1
+        urls = [reverse("index")]
+        urls += [f"{reverse('index')}?page={number}" for number in range(2, pages + 1)]
+        for slug in Group.objects.values_list("slug", flat=True):
+            urls.append(reverse("group_url", args=[slug]))
+        usernames = (
+            ProfileStats.objects.filter(followers__gt=0)
+            .order_by("-followers")
+            .values_list("user__username", flat=True)[:profiles]
+        )
+        for username in usernames:
+            urls.append(reverse("profile", args=[username]))
+        return urls
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options["budget"]
+        host, secure = options["host"], options["secure"]
+
+        def render(url):
+            # прогреваем то, что видят анонимные посетители
+            if time.monotonic() > deadline:
+                return None
+            try:
+                return Client(HTTP_HOST=host).get(url, secure=secure).status_code
+            finally:
+                connection.close()
+
+        urls = self.urls(options["pages"], options["profiles"])
+        with ThreadPoolExecutor(options["workers"]) as pool:
+            futures = {pool.submit(render, url): url for url in urls}
+            wait(futures, timeout=max(deadline - time.monotonic(), 0))
+            for future in futures:
+                future.cancel()
+        warmed = skipped = 0
+        for future, url in futures.items():
+            if future.cancelled() or future.result() is None:
+                skipped += 1
+            elif future.result() == 200:
+                warmed += 1
+            else:
+                self.stderr.write(f"{url}: HTTP {future.result()}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Warmed {warmed} page(s), skipped {skipped} over the time budget"
+            )
+        )
@@ -0,0 +1,16 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0017_auto_20261018_0605"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="post",
+            options={"ordering": ["-pub_date", "-id"]},
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0018_alter_post_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostCounter",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Список"
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(verbose_name="Количество записей"),
+                ),
+                (
+                    "is_estimate",
+                    models.BooleanField(default=False, verbose_name="Оценка"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:09
+
+from django.db import migrations, models, router
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comment_count(apps, schema_editor):
+    Comment = apps.get_model("posts", "Comment")
+    Post = apps.get_model("posts", "Post")
+    if not router.allow_migrate_model(schema_editor.connection.alias, Comment):
+        # комментарии в отдельной базе (DATABASE_MODELS): подзапрос к ним
+        # невозможен, счётчики пересчитает команда reconcile_comment_counts
+        return
+    totals = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Post.objects.update(comment_count=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0019_postcounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество комментариев"
+            ),
+        ),
+        migrations.RunPython(fill_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0020_post_comment_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfileStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                (
+                    "followers",
+                    models.PositiveIntegerField(default=0, verbose_name="Подписчиков"),
+                ),
+                (
+                    "following",
+                    models.PositiveIntegerField(default=0, verbose_name="Подписан"),
+                ),
+                (
+                    "posts",
+                    models.PositiveIntegerField(default=0, verbose_name="Записей"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0022_post_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="thumbnails",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Превью картинки"
+            ),
+        ),
+    ]
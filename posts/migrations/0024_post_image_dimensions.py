@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:24
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def fill_image_dimensions(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    storage = Post._meta.get_field("image").storage
+    images = Post.objects.exclude(image="").exclude(image__isnull=True)
+    for pk, name in images.values_list("pk", "image").iterator():
+        try:
+            with storage.open(name) as image:
+                width, height = get_image_dimensions(image)
+        except (OSError, SuspiciousFileOperation):
+            width = height = None
+        Post.objects.filter(pk=pk).update(
+            image_width=width or 0, image_height=height or 0
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0023_post_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Высота картинки"
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Ширина картинки"
+            ),
+        ),
+        migrations.RunPython(fill_image_dimensions, migrations.RunPython.noop),
+    ]
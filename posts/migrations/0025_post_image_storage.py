@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:29
+
+import posts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0024_post_image_dimensions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=posts.storage.ContentAddressedStorage(),
+                upload_to="posts/",
+            ),
+        ),
+    ]
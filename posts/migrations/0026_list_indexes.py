@@ -0,0 +1,112 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0025_post_image_storage"),
+    ]
+
+    operations = [
+        # сначала новые индексы, потом удаляем перекрытые ими
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "created", "id"], name="posts_comment_post_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["author", "user"], name="posts_follow_author_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["-pub_date", "-id"], name="posts_post_feed_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["group", "-pub_date", "-id"], name="posts_post_group_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-pub_date", "-id"], name="posts_post_author_idx"
+            ),
+        ),
+        migrations.AlterModelOptions(
+            name="comment",
+            options={"ordering": ["created", "id"]},
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="post",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="comments",
+                to="posts.post",
+                verbose_name="Пост этого комментария",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="follow",
+            name="author",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="following",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="На кого подписался",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="follow",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="follower",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Кто подписался",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="author",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="posts",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор поста",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="group",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="group_posts",
+                to="posts.group",
+                verbose_name="Группа поста",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="pub_date",
+            field=models.DateTimeField(
+                auto_now_add=True, verbose_name="Дата публикации"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from posts import search
+
+    search.install(schema_editor.connection.alias)
+
+
+def uninstall(apps, schema_editor):
+    from posts import search
+
+    search.uninstall(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0026_list_indexes"),
+    ]
+
+    operations = [
+        # полнотекстовый индекс FTS5 (только SQLite), см. posts/search.py
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0027_post_search"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="author",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="comments",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор комментария",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="post",
+            field=models.ForeignKey(
+                db_constraint=False,
+                db_index=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="comments",
+                to="posts.post",
+                verbose_name="Пост этого комментария",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="follow",
+            name="author",
+            field=models.ForeignKey(
+                db_constraint=False,
+                db_index=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="following",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="На кого подписался",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="follow",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                db_index=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="follower",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Кто подписался",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:12
+
+from django.db import migrations, router
+
+BATCH_SIZE = 500
+
+
+def fill_timeline(apps, schema_editor):
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+    alias = schema_editor.connection.alias
+    if not router.allow_migrate_model(alias, TimelineEntry):
+        return
+    # подписки могут жить в своей базе (DATABASE_MODELS): читаем их оттуда,
+    # а не с реплики и не соединением с постами
+    follows = Follow.objects.using(router.db_for_write(Follow))
+    batch = []
+    for user_id, author_id in follows.values_list("user_id", "author_id").iterator():
+        posts = Post.objects.using(alias).filter(author_id=author_id)
+        for post_id, pub_date in posts.values_list("pk", "pub_date").iterator():
+            batch.append(
+                TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            )
+            if len(batch) >= BATCH_SIZE:
+                TimelineEntry.objects.using(alias).bulk_create(
+                    batch, ignore_conflicts=True
+                )
+                batch = []
+    TimelineEntry.objects.using(alias).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0028_cross_database_relations"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations, router
+from django.db.models import Count
+
+BATCH_SIZE = 500
+
+
+def _totals(queryset, field):
+    return dict(
+        queryset.order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values_list(field, "total")
+    )
+
+
+def fill_profile_stats(apps, schema_editor):
+    # тот же пересчёт, что и counters.recompute_profile_stats, но на
+    # исторических моделях
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+    ProfileStats = apps.get_model("posts", "ProfileStats")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    alias = schema_editor.connection.alias
+    if not router.allow_migrate_model(alias, ProfileStats):
+        return
+    # подписки могут жить в своей базе (DATABASE_MODELS)
+    follows = Follow.objects.using(router.db_for_write(Follow))
+    followers = _totals(follows, "author_id")
+    following = _totals(follows, "user_id")
+    written = _totals(Post.objects.using(alias), "author_id")
+    user_ids = list(User.objects.using(alias).values_list("pk", flat=True))
+    ProfileStats.objects.using(alias).filter(user_id__in=user_ids).delete()
+    ProfileStats.objects.using(alias).bulk_create(
+        [
+            ProfileStats(
+                user_id=user_id,
+                followers=followers.get(user_id, 0),
+                following=following.get(user_id, 0),
+                posts=written.get(user_id, 0),
+            )
+            for user_id in user_ids
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0029_backfill_timeline"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_profile_stats, migrations.RunPython.noop),
+    ]
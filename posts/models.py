@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -15,11 +17,16 @@ class Group(models.Model):
 
 class Post(models.Model):
     text = models.TextField(verbose_name="Текст поста")
-    pub_date = models.DateTimeField(
-        verbose_name="Дата публикации", auto_now_add=True, db_index=True
-    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации", auto_now_add=True)
+    # метка версии для кэша отрисованных карточек
+    updated = models.DateTimeField(verbose_name="Дата изменения", auto_now=True)
+    # одиночные индексы внешних ключей не нужны: их покрывают составные
     author = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="posts", verbose_name="Автор поста"
+        User,
+        on_delete=models.CASCADE,
+        related_name="posts",
+        db_index=False,
+        verbose_name="Автор поста",
     )
     group = models.ForeignKey(
         Group,
@@ -27,13 +34,44 @@ class Post(models.Model):
         blank=True,
         null=True,
         related_name="group_posts",
+        db_index=False,
         verbose_name="Группа поста",
     )
 
-    image = models.ImageField(upload_to="posts/", blank=True, null=True)
+    # одинаковые картинки хранятся одним файлом, имя — хэш содержимого
+    image = models.ImageField(
+        upload_to="posts/", storage=ContentAddressedStorage(), blank=True, null=True
+    )
+    # размеры оригинала: заполняются сигналом при сохранении, 0 — неизвестны
+    # (не width_field: тот открывал бы файл при загрузке поста без размеров)
+    image_width = models.PositiveIntegerField(
+        blank=True, null=True, editable=False, verbose_name="Ширина картинки"
+    )
+    image_height = models.PositiveIntegerField(
+        blank=True, null=True, editable=False, verbose_name="Высота картинки"
+    )
+    # готовые превью картинки (см. posts/thumbnails.py): src и srcset по форматам
+    thumbnails = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Превью картинки"
+    )
+    # денормализованный счётчик, ведётся сигналами Comment
+    comment_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество комментариев"
+    )
 
     class Meta:
-        ordering = ["-pub_date"]
+        # id различает посты с одинаковой датой — нужен для курсоров
+        ordering = ["-pub_date", "-id"]
+        # по индексу на каждый список постов: лента, группа, автор
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], name="posts_post_feed_idx"),
+            models.Index(
+                fields=["group", "-pub_date", "-id"], name="posts_post_group_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"], name="posts_post_author_idx"
+            ),
+        ]
 
     def __str__(self):
         # выводим кратко информацию о созданной записи
@@ -46,22 +84,37 @@ class Post(models.Model):
         )
 
 
+# комментарии и подписки могут жить в отдельной базе (DATABASE_MODELS), а
+# связи между базами не проверить ни ограничениями, ни каскадом Django;
+# запрет удалять пост или пользователя с ними проверяют сигналы pre_delete
+# и админка (см. protected_relations)
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
-        on_delete=models.PROTECT,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name="comments",
+        db_index=False,
         verbose_name="Пост этого комментария",
     )
     author = models.ForeignKey(
         User,
-        on_delete=models.PROTECT,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name="comments",
         verbose_name="Автор комментария",
     )
     text = models.TextField(verbose_name="Текст комментария")
     created = models.DateTimeField(verbose_name="Дата комментария", auto_now_add=True)
 
+    class Meta:
+        ordering = ["created", "id"]
+        indexes = [
+            models.Index(
+                fields=["post", "created", "id"], name="posts_comment_post_idx"
+            ),
+        ]
+
     def __str__(self):
         # выводим кратко информацию о созданном комментарии
         pubdate = self.created.date()
@@ -74,18 +127,101 @@ class Comment(models.Model):
 
 
 class Follow(models.Model):
+    # (user, author) индексирует unique_together, (author, user) — Meta.indexes
     user = models.ForeignKey(
         User,
-        on_delete=models.PROTECT,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name="follower",
+        db_index=False,
         verbose_name="Кто подписался",
     )
     author = models.ForeignKey(
         User,
-        on_delete=models.PROTECT,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name="following",
+        db_index=False,
         verbose_name="На кого подписался",
     )
 
     class Meta:
         unique_together = ["user", "author"]
+        indexes = [
+            models.Index(fields=["author", "user"], name="posts_follow_author_idx"),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Materialized "favorite authors" feed row: one per (reader, post)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Читатель ленты",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост в ленте",
+    )
+    # копия Post.pub_date, чтобы лента читалась одним проходом по индексу
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        ordering = ["-pub_date", "-post"]
+        unique_together = ["user", "post"]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"], name="posts_timeline_feed_idx"
+            ),
+        ]
+
+
+def protected_relations(instance):
+    """Comments and follows keeping a post or a user from being deleted.
+
+    Returns ``(queryset, field name)`` pairs in place of ``PROTECT``, which
+    cannot look into another database.
+    """
+    if isinstance(instance, Post):
+        return [(Comment.objects.filter(post_id=instance.pk), "post")]
+    if isinstance(instance, User):
+        return [
+            (Comment.objects.filter(author_id=instance.pk), "author"),
+            (Follow.objects.filter(user_id=instance.pk), "user"),
+            (Follow.objects.filter(author_id=instance.pk), "author"),
+        ]
+    return []
+
+
+class PostCounter(models.Model):
+    """Cached size of a post list (index, group, author, follow feed)."""
+
+    key = models.CharField(max_length=100, unique=True, verbose_name="Список")
+    count = models.PositiveIntegerField(verbose_name="Количество записей")
+    # список оказался слишком большим и посчитан лишь до порога
+    is_estimate = models.BooleanField(default=False, verbose_name="Оценка")
+
+    def __str__(self):
+        return f"{self.key}: {self.count}"
+
+
+class ProfileStats(models.Model):
+    """Precomputed profile counters, read by profile pages in one lookup."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Пользователь",
+    )
+    followers = models.PositiveIntegerField(default=0, verbose_name="Подписчиков")
+    following = models.PositiveIntegerField(default=0, verbose_name="Подписан")
+    posts = models.PositiveIntegerField(default=0, verbose_name="Записей")
+
+    def __str__(self):
+        return f"Статистика {self.user}"
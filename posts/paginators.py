@@ -0,0 +1,263 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from yatube.routers import use_primary
+
+from .models import PostCounter
+
+# по 10 записей на странице
+PAGE_SIZE = 10
+# номера страниц (OFFSET) оставляем только для первых страниц,
+# глубже листаем по курсору (pub_date, id)
+NUMBERED_PAGES = 5
+# больше записей точно не считаем: хватит оценки, глубже листают курсором
+ESTIMATE_THRESHOLD = 10000
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(pub_date, pk):
+    raw = f"{pub_date.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.split("|")
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor("Некорректный курсор")
+    if pub_date is None:
+        raise InvalidCursor("Некорректный курсор")
+    return pub_date, pk
+
+
+class CachedCountPaginator(Paginator):
+    """``Paginator`` that takes the list size from the ``PostCounter`` table.
+
+    A missing counter row is recomputed once on the primary database with
+    a bounded ``COUNT`` and stored; lists above ``ESTIMATE_THRESHOLD`` keep
+    the threshold as an estimate (``count_is_estimate``) instead of being
+    counted in full.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        row = self._counter_row()
+        if row is None:
+            # счётчик сохранится надолго: пересчёт по отставшей реплике
+            # закрепил бы неверное число
+            with use_primary():
+                row = self._counter_row() or self._recount()
+        count, self.count_is_estimate = row
+        return count
+
+    def _counter_row(self):
+        return (
+            PostCounter.objects.filter(key=self.count_key)
+            .values_list("count", "is_estimate")
+            .first()
+        )
+
+    def _recount(self):
+        count = self.object_list.order_by()[: ESTIMATE_THRESHOLD + 1].count()
+        is_estimate = count > ESTIMATE_THRESHOLD
+        count = min(count, ESTIMATE_THRESHOLD)
+        PostCounter.objects.update_or_create(
+            key=self.count_key, defaults={"count": count, "is_estimate": is_estimate}
+        )
+        return count, is_estimate
+
+    def page_links(self, number, last=None):
+        """Elided page range: the first pages and the current one's neighbours.
+
+        Gaps become ``ELLIPSIS``, so the HTML size does not depend on the
+        list size; pages after ``last`` are reached by cursor links.
+        """
+        last = min(last or self.num_pages, self.num_pages)
+        pages = set(range(1, min(NUMBERED_PAGES, last) + 1))
+        pages.update(range(max(number - 2, 1), min(number + 2, last) + 1))
+        links = []
+        previous = 0
+        for i in sorted(pages):
+            if i - previous > 1:
+                links.append(self.ELLIPSIS)
+            links.append(i)
+            previous = i
+        if previous < self.num_pages:
+            links.append(self.ELLIPSIS)
+        return links
+
+
+class CursorPage(Sequence):
+    """One keyset page; quacks like ``django.core.paginator.Page``."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous
+        # курсоры считаем сразу: представление может подменить object_list
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list:
+            if self._has_next:
+                self.next_cursor = paginator.cursor_for(object_list[-1])
+            if has_previous:
+                self.previous_cursor = paginator.cursor_for(object_list[0])
+
+    def __repr__(self):
+        return f"<Cursor page of {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """Keyset pagination over a ``(pub_date, id)`` descending ordering.
+
+    Unlike ``Paginator`` it never runs ``COUNT(*)`` and never uses ``OFFSET``:
+    every page is an index range scan starting right after the cursor.
+    ``keys`` names the date and the tie-breaking id field of the queryset
+    model, e.g. ``("pub_date", "post_id")`` for timeline entries.
+    """
+
+    def __init__(self, object_list, per_page, keys=("pub_date", "id")):
+        self.keys = keys
+        self.object_list = object_list.order_by(*[f"-{key}" for key in keys])
+        self.per_page = per_page
+
+    def cursor_for(self, obj):
+        if isinstance(obj, dict):
+            return encode_cursor(*[obj[key] for key in self.keys])
+        return encode_cursor(*[getattr(obj, key) for key in self.keys])
+
+    # лишнее на вид условие date <= x даёт SQLite границу для поиска по
+    # индексу: с одним OR план — полный проход по индексу от начала ленты
+    def _older(self, cursor):
+        date_key, id_key = self.keys
+        pub_date, pk = decode_cursor(cursor)
+        return self.object_list.filter(
+            Q(**{f"{date_key}__lt": pub_date})
+            | Q(**{date_key: pub_date, f"{id_key}__lt": pk}),
+            **{f"{date_key}__lte": pub_date},
+        )
+
+    def _newer(self, cursor):
+        date_key, id_key = self.keys
+        pub_date, pk = decode_cursor(cursor)
+        return self.object_list.filter(
+            Q(**{f"{date_key}__gt": pub_date})
+            | Q(**{date_key: pub_date, f"{id_key}__gt": pk}),
+            **{f"{date_key}__gte": pub_date},
+        ).reverse()
+
+    def count_newer(self, cursor, limit):
+        """Number of items above the cursor, counted up to ``limit``."""
+        if cursor is None:
+            return self.object_list.order_by()[:limit].count()
+        return self._newer(cursor).order_by()[:limit].count()
+
+    def page(self, before=None, after=None):
+        if after:
+            items = list(self._newer(after)[: self.per_page + 1])
+            has_previous = len(items) > self.per_page
+            items = items[: self.per_page][::-1]
+            return CursorPage(items, self, True, has_previous)
+        queryset = self._older(before) if before else self.object_list
+        items = list(queryset[: self.per_page + 1])
+        has_next = len(items) > self.per_page
+        return CursorPage(items[: self.per_page], self, has_next, bool(before))
+
+    def get_page(self, before=None, after=None):
+        """Return a valid page, falling back to the first one on a bad cursor."""
+        try:
+            return self.page(before=before, after=after)
+        except InvalidCursor:
+            return self.page()
+
+
+def page_number(request):
+    try:
+        return max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        return 1
+
+
+def cursor_after_numbered(object_list, keys):
+    """Cursor of the last item of the last numbered page.
+
+    ``None`` when the list ends before it. One bounded ``OFFSET`` query.
+    """
+    paginator = CursorPaginator(object_list, PAGE_SIZE, keys)
+    bottom = NUMBERED_PAGES * PAGE_SIZE - 1
+    items = list(paginator.object_list[bottom : bottom + 1])
+    return paginator.cursor_for(items[0]) if items else None
+
+
+def paginate(request, object_list, keys=("pub_date", "id"), count_key=None):
+    """Paginate a post list by ``?page=N`` or by ``?before=``/``?after=``.
+
+    Returns ``(paginator, page)``. Only the first ``NUMBERED_PAGES`` pages
+    go by number; the last of them links forward with a cursor, and deeper
+    ``?page=N`` is served as the first cursor page, so deep pages never hit
+    ``OFFSET``. ``count_key`` names the ``PostCounter`` row caching the list
+    size. ``keys=None`` turns cursors off, for lists not ordered by date
+    (search).
+    """
+    before = request.GET.get("before")
+    after = request.GET.get("after")
+    if keys and not (before or after) and page_number(request) > NUMBERED_PAGES:
+        before = cursor_after_numbered(object_list, keys)
+    if keys and (before or after):
+        paginator = CursorPaginator(object_list, PAGE_SIZE, keys)
+        return paginator, paginator.get_page(before=before, after=after)
+
+    paginator = CachedCountPaginator(object_list, PAGE_SIZE, count_key=count_key)
+    page = paginator.get_page(request.GET.get("page"))
+    add_links(paginator, page, keys)
+    return paginator, page
+
+
+def add_links(paginator, page, keys):
+    """Attach the page-number links and, on deep pages, the cursor link."""
+    page.numbered_range = paginator.page_links(
+        page.number, NUMBERED_PAGES if keys else None
+    )
+    page.next_cursor = None
+    if keys and page.number >= NUMBERED_PAGES and page.has_next():
+        page.next_cursor = CursorPaginator(
+            paginator.object_list, PAGE_SIZE, keys
+        ).cursor_for(page[-1])
@@ -0,0 +1,110 @@
+"""Full-text search over post texts.
+
+On SQLite the texts are indexed by the FTS5 table ``posts_post_fts``: an
+external-content index over ``posts_post`` kept in sync by triggers, so
+neither the ORM nor ``bulk_create``/``update`` can bypass it. Other
+databases fall back to ``icontains`` filters.
+"""
+
+import re
+
+from django.db import connections, router
+
+from .models import Post
+
+FTS_TABLE = "posts_post_fts"
+
+CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    text, content='posts_post', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+TRIGGERS = {
+    f"{FTS_TABLE}_insert": f"""
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+        END
+    """,
+    f"{FTS_TABLE}_delete": f"""
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+    """,
+    f"{FTS_TABLE}_update": f"""
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+        END
+    """,
+}
+
+
+def install(using="default"):
+    """Create the index and its triggers where they are missing.
+
+    Django rebuilds SQLite tables on many ``AlterField`` migrations and the
+    triggers go away with the old table, so this also runs after every
+    ``migrate``. Returns whether anything had to be (re)created.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or not router.allow_migrate_model(using, Post):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') "
+            "AND name LIKE %s",
+            [f"{FTS_TABLE}%"],
+        )
+        existing = {name for (name,) in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        if FTS_TABLE in existing and not missing:
+            return False
+        cursor.execute(CREATE_TABLE)
+        for name in missing:
+            cursor.execute(f"CREATE TRIGGER {name} {TRIGGERS[name]}")
+        # пока триггеров не было, индекс мог разойтись с таблицей
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall(using="default"):
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def terms(query):
+    return re.findall(r"\w+", query)
+
+
+def match_expression(query):
+    """FTS5 query: every word must match, as a word prefix."""
+    return " ".join(f'"{term}"*' for term in terms(query))
+
+
+def search_posts(queryset, query):
+    """Posts of the queryset matching the query, best matches first.
+
+    Results of the FTS index get a ``rank`` (lower is better).
+    """
+    words = terms(query)
+    if not words:
+        return queryset.none()
+    if connections[queryset.db].vendor != "sqlite":
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = posts_post.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match_expression(query)],
+        select={"rank": f"{FTS_TABLE}.rank"},
+        order_by=["rank", "-pub_date"],
+    )
@@ -0,0 +1,157 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import ProtectedError
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import caching, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User, protected_relations
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # при редактировании пост мог сменить группу — запомним прежнюю
+    instance._previous_group_id = previous_image = None
+    if instance.pk is not None:
+        instance._previous_group_id, previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list("group_id", "image").first()
+        ) or (None, None)
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+    elif instance.image.name != previous_image or instance.image_width is None:
+        # размеры читаются из заголовка картинки, пока она ещё в памяти
+        try:
+            width, height = instance.image.width, instance.image.height
+        except (OSError, SuspiciousFileOperation):
+            width = height = None
+        instance.image_width, instance.image_height = width or 0, height or 0
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    previous_group_id = getattr(instance, "_previous_group_id", None)
+    if created:
+        follower_ids = timeline.fan_out_post(instance)
+        counters.invalidate_post(instance, follower_ids)
+        counters.bump_profile_stats(instance.author_id, "posts", 1)
+    elif previous_group_id != instance.group_id:
+        counters.invalidate_groups(previous_group_id, instance.group_id)
+    caching.bump_post(instance.author_id, instance.group_id, previous_group_id)
+
+
+def _protect(instance):
+    # on_delete=PROTECT для связей, которые могут вести в другую базу
+    protected = {}
+    for related, field in protected_relations(instance):
+        objects = set(related)
+        if objects:
+            protected[f"'{related.model.__name__}.{field}'"] = objects
+    if protected:
+        raise ProtectedError(
+            f"Cannot delete some instances of model '{type(instance).__name__}' "
+            f"because they are referenced through protected foreign keys: "
+            f"{', '.join(protected)}.",
+            set().union(*protected.values()),
+        )
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _protect(instance)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    _protect(instance)
+
+
+# поля пользователя, которые выводятся на страницах и в карточках постов
+USER_SHOWN_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    # вход обновляет только last_login — тогда страницы не трогаем
+    instance._previous_shown = None
+    if instance.pk is None or (
+        update_fields is not None and not set(update_fields) & set(USER_SHOWN_FIELDS)
+    ):
+        return
+    instance._previous_shown = (
+        User.objects.filter(pk=instance.pk).values_list(*USER_SHOWN_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_shown", None)
+    shown = tuple(getattr(instance, field) for field in USER_SHOWN_FIELDS)
+    if created:
+        caching.bump(caching.profile_scope(instance.username))
+    elif previous is not None and previous != shown:
+        # имя и ссылки автора есть в карточках его постов на любых страницах
+        caching.bump(
+            caching.GLOBAL,
+            caching.profile_scope(previous[0]),
+            caching.profile_scope(instance.username),
+        )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.invalidate_post(instance)
+    counters.bump_profile_stats(instance.author_id, "posts", -1)
+    caching.bump_post(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author(instance.user_id, instance.author_id)
+        counters.invalidate(counters.follow_key(instance.user_id))
+        counters.bump_profile_stats(instance.author_id, "followers", 1)
+        counters.bump_profile_stats(instance.user_id, "following", 1)
+        caching.bump_profiles(instance.user_id, instance.author_id)
+        caching.bump(caching.follow_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+    counters.invalidate(counters.follow_key(instance.user_id))
+    counters.bump_profile_stats(instance.author_id, "followers", -1)
+    counters.bump_profile_stats(instance.user_id, "following", -1)
+    caching.bump_profiles(instance.user_id, instance.author_id)
+    caching.bump(caching.follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance.post_id)
+    caching.bump_comment(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_removed(instance.post_id)
+    caching.bump_comment(instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # название группы выводится в карточках постов на всех страницах
+    caching.bump(caching.GLOBAL)
+
+
+@receiver(post_migrate)
+def search_index_installed(sender, using, **kwargs):
+    # перестройка таблицы posts_post в миграциях удаляет триггеры индекса
+    if sender.label == "posts":
+        search.install(using)
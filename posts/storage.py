@@ -0,0 +1,46 @@
+"""Content-addressed storage for post images.
+
+Files are named by the SHA-256 of their content (``posts/ab/ab12….jpg``),
+so identical uploads share one file and, through their common name, one set
+of thumbnails. Files are never overwritten or deleted on save; the
+``gc_media`` command removes the ones no post refers to.
+"""
+
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(directory, digest[:2], f"{digest}{extension}")
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # такой файл уже загружали — переиспользуем его; свежая дата
+            # изменения не даст gc_media удалить его до сохранения поста
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,194 @@
+"""Atom and RSS feeds of the index, the groups and the authors.
+
+The document is written while the posts are read: the head first, then one
+entry at a time from a ``.iterator()`` queryset, so neither the queryset nor
+the XML is ever held in memory whole. A complete document is kept in the
+cache under the generation stamps of its scopes and served from there until
+the next write; pollers with ``If-None-Match``/``If-Modified-Since`` get a
+304 without a single query.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from io import BytesIO
+
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, reverse
+from django.utils import feedgenerator
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.views.decorators.http import require_safe
+
+from yatube.routers import use_primary
+
+from . import caching
+from .models import Group, Post, User
+
+# записей в ленте: читатели опрашивают её, а не листают
+FEED_SIZE = 50
+TITLE_WORDS = 8
+
+
+class StreamingFeedMixin:
+    """Write the feed head, the items and the tail as separate chunks."""
+
+    def latest_post_date(self):
+        # записи ещё не прочитаны: дату обновления передаёт представление
+        return self.feed["updated"]
+
+    def stream(self, items):
+        """Yield the document in byte chunks, one per item.
+
+        ``items`` yields ``add_item`` keyword arguments.
+        """
+        buffer = BytesIO()
+        handler = SimplerXMLGenerator(buffer, "utf-8")
+
+        def take():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        self.start(handler)
+        yield take()
+        for item in items:
+            # add_item приводит значения к строкам; в памяти одна запись
+            self.add_item(**item)
+            for entry in self.items:
+                handler.startElement(self.item_element, self.item_attributes(entry))
+                self.add_item_elements(handler, entry)
+                handler.endElement(self.item_element)
+            self.items.clear()
+            yield take()
+        self.end(handler)
+        yield take()
+
+
+class AtomFeed(StreamingFeedMixin, feedgenerator.Atom1Feed):
+    item_element = "entry"
+
+    def start(self, handler):
+        handler.startDocument()
+        handler.startElement("feed", self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        handler.endElement("feed")
+
+
+class RssFeed(StreamingFeedMixin, feedgenerator.Rss201rev2Feed):
+    item_element = "item"
+
+    def start(self, handler):
+        handler.startDocument()
+        handler.startElement("rss", self.rss_attributes())
+        handler.startElement("channel", self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement("rss")
+
+
+FORMATS = {"atom": AtomFeed, "rss": RssFeed}
+
+
+def _items(request, posts):
+    # записи читаются уже после middleware и conditional, а документ ляжет в
+    # кэш под новыми штампами на часы: только с основной базы
+    with use_primary():
+        for post in posts.iterator():
+            link = request.build_absolute_uri(
+                reverse("post_single", args=[post.author.username, post.pk])
+            )
+            yield {
+                "title": Truncator(post.text).words(TITLE_WORDS),
+                "link": link,
+                "description": linebreaks(post.text, autoescape=True),
+                "author_name": post.author.get_full_name() or post.author.username,
+                "pubdate": post.pub_date,
+                "updateddate": post.updated,
+                "unique_id": link,
+                "categories": [post.group.title] if post.group else (),
+            }
+
+
+def _keep(key, chunks):
+    # полный документ — в кэш; оборванная на середине отдача туда не попадёт
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b"".join(parts), caching.PAGE_TIMEOUT)
+
+
+def _feed(request, kind, scopes, posts, title, link, description=""):
+    feed_class = FORMATS.get(kind)
+    if feed_class is None:
+        raise Http404("Нет такого формата ленты")
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    stamps = caching.generation_stamps(caching.GLOBAL, *scopes)
+    key = f"feed:{url}:{'-'.join(str(stamp) for stamp in stamps.values())}"
+    document = cache.get(key)
+    if document is not None:
+        return HttpResponse(document, content_type=feed_class.content_type)
+    # лента обновлена, когда сменился штамп любой из её областей
+    updated = datetime.fromtimestamp(max(stamps.values()) / 10**9, tz=timezone.utc)
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description or title,
+        language="ru",
+        feed_url=request.build_absolute_uri(),
+        updated=updated,
+    )
+    posts = posts.select_related("author", "group")[:FEED_SIZE]
+    return StreamingHttpResponse(
+        _keep(key, feed.stream(_items(request, posts))),
+        content_type=feed_class.content_type,
+    )
+
+
+@require_safe
+@caching.conditional(lambda request, kind: [caching.INDEX])
+def index(request, kind):
+    return _feed(
+        request,
+        kind,
+        [caching.INDEX],
+        Post.objects.all(),
+        "Yatube: последние записи",
+        reverse("index"),
+    )
+
+
+@require_safe
+@caching.conditional(lambda request, kind, slug: [caching.group_scope(slug)])
+def group_posts(request, kind, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed(
+        request,
+        kind,
+        [caching.group_scope(slug)],
+        Post.objects.filter(group_id=group.pk),
+        f"Yatube: {group.title}",
+        reverse("group_url", args=[slug]),
+        group.description,
+    )
+
+
+@require_safe
+@caching.conditional(lambda request, kind, username: [caching.profile_scope(username)])
+def profile(request, kind, username):
+    author = get_object_or_404(User, username=username)
+    return _feed(
+        request,
+        kind,
+        [caching.profile_scope(username)],
+        Post.objects.filter(author_id=author.pk),
+        f"Yatube: {author.get_full_name() or author.username}",
+        reverse("profile", args=[username]),
+    )
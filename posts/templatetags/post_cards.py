@@ -0,0 +1,40 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import caching
+from posts.paginators import encode_cursor
+
+register = template.Library()
+
+EDIT_SLOT = "<!-- edit-link -->"
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Render a post card from the fragment cache.
+
+    Cards are shared by all users; the author-only edit link is put into
+    ``EDIT_SLOT`` on every render. Views prefetch the cards of a page with
+    ``caching.get_cards`` into ``post_cards``.
+    """
+    key, html = context.get("post_cards", {}).get(post.pk, (None, None))
+    if key is None:
+        key = caching.card_key(post)
+        html = cache.get(key)
+    if html is None:
+        html = render_to_string("posts/includes/post_card.html", {"post": post})
+        # ключ версионный: значение под ним никогда не меняется
+        cache.add(key, html, caching.PAGE_TIMEOUT)
+    user = context.get("user")
+    if user is not None and user.is_authenticated and user.pk == post.author_id:
+        link = render_to_string("posts/includes/post_edit_link.html", {"post": post})
+        html = html.replace(EDIT_SLOT, link)
+    return mark_safe(html)
+
+
+@register.filter
+def cursor(post):
+    """Keyset cursor of a post, as in ``?before=``/``?after=`` links."""
+    return encode_cursor(post.pub_date, post.pk)
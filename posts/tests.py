@@ -1,10 +1,56 @@
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
+from xml.etree import ElementTree
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
 from django.shortcuts import reverse
-from django.test import Client, TestCase
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
 
-from .models import Comment, Follow, Group, Post
+from . import (
+    async_views,
+    caching,
+    counters,
+    live,
+    syndication,
+    thumbnails,
+    views,
+)
+from .models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    PostCounter,
+    ProfileStats,
+    TimelineEntry,
+)
+from .paginators import CachedCountPaginator, encode_cursor
 
 User = get_user_model()
 
@@ -106,6 +152,29 @@ class TestPostsAndLogin(TestCase):
         response = self.client.get(reverse("profile", args=[self.user.username]))
         self.assertEqual(response.status_code, 200)
 
+    def test_signup_rejects_site_paths(self):
+        """Usernames taken by site pages (search/, api/posts/...) are refused"""
+        data = {"username": "", "password1": "Zx9!kq27Lm", "password2": "Zx9!kq27Lm"}
+        for username in ("search", "more", "live", "feeds", "posts", "group"):
+            with self.subTest(username=username):
+                data["username"] = username
+                response = self.client_unauthorized.post(reverse("signup"), data)
+                self.assertFormError(
+                    response, "form", "username", "Это имя занято адресом сайта"
+                )
+        data["username"] = "kyle"
+        response = self.client_unauthorized.post(reverse("signup"), data)
+        self.assertRedirects(response, reverse("login"))
+
+    def test_shadowed_usernames_listed(self):
+        """Existing accounts hidden by site pages are reported"""
+        User.objects.create_user(username="posts", password="Zx9!kq27Lm")
+        out = StringIO()
+        call_command("shadowed_usernames", stdout=out)
+        self.assertEqual(out.getvalue().split("\n")[0], "posts")
+        with self.assertRaises(CommandError):
+            call_command("shadowed_usernames", "--fail", stdout=StringIO())
+
     def test_404_url(self):
         """Test 404"""
         response = self.client.get("/404error/")
@@ -211,21 +280,41 @@ class TestPostsAndLogin(TestCase):
         self.assertEqual(post_one, post_two)
 
     def test_cache(self):
-        """Test 20 sec index cache"""
+        """Index stays cached until a write invalidates it"""
         response = self.client.get(reverse("index"))
-        cache_test = response["Cache-Control"]
-        self.assertEqual(cache_test, "max-age=20")
+        self.assertEqual(response["Cache-Control"], "max-age=0")
         self.assertEqual(len(response.context["page"]), 1)
-        # create skynet post
-        self.post_skynet = Post.objects.create(
-            text="Skynet test", author=self.author, group=self.testgroup
-        )
         response = self.client.get(reverse("index"))
         self.assertIsNone(response.context)
-        cache.clear()
+        # create skynet post
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_skynet = Post.objects.create(
+                text="Skynet test", author=self.author, group=self.testgroup
+            )
         response = self.client.get(reverse("index"))
         self.assertEqual(len(response.context["page"]), 2)
 
+    def test_cache_invalidation_scopes(self):
+        """A post invalidates its own group page but not the others"""
+        group_url = reverse("group_url", args=[self.testgroup.slug])
+        other_url = reverse("group_url", args=[self.testgroup2.slug])
+        self.client.get(group_url)
+        self.client.get(other_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Skynet", author=self.author, group=self.testgroup)
+        self.assertIsNotNone(self.client.get(group_url).context)
+        self.assertIsNone(self.client.get(other_url).context)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.author, text="Hi")
+        response = self.client.get(reverse("profile", args=[self.user.username]))
+        self.assertContains(response, "1 комментариев")
+
+    def test_cache_is_per_user(self):
+        """Cached pages are not shared between users"""
+        self.client.get(reverse("index"))
+        response = self.client_unauthorized.get(reverse("index"))
+        self.assertNotContains(response, self.user.username + ".")
+
     def test_logged_in_subscribe(self):
         """Logged in can subscribe to authors"""
         response = self.client.get(
@@ -313,3 +402,1241 @@ class TestPostsAndLogin(TestCase):
         items = response.context["items"]
         elements = len(items)
         self.assertEqual(elements, 0)
+
+
+class TestTimeline(TestCase):
+    def setUp(self):
+        """Reader, author and one already published post"""
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.old_post = Post.objects.create(text="Old post", author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def timeline(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.reader).values_list(
+                "post_id", flat=True
+            )
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Following an author copies their existing posts into the timeline"""
+        self.client.get(reverse("profile_follow", args=[self.author.username]))
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+    def test_new_post_fans_out(self):
+        """New post is pushed to followers only"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text="New post", author=self.author)
+        Post.objects.create(text="Stranger's post", author=self.reader)
+        self.assertEqual(self.timeline(), [new_post.pk, self.old_post.pk])
+        response = self.client.get(reverse("follow_index"))
+        self.assertEqual(response.context["page"][0], new_post)
+
+    def test_unfollow_clears_timeline(self):
+        """Unfollowing removes the author's posts from the timeline"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(reverse("profile_unfollow", args=[self.author.username]))
+        self.assertEqual(self.timeline(), [])
+
+    def test_rebuild_command(self):
+        """rebuild_timeline restores timelines from Follow rows"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timeline", stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        """Enough posts for several pages"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.posts = [
+            Post.objects.create(text=f"Post {i}", author=self.author) for i in range(25)
+        ][::-1]
+        self.client = Client()
+        cache.clear()
+
+    def get_page(self, **params):
+        cache.clear()
+        return self.client.get(reverse("index"), params).context["page"]
+
+    def test_before_and_after_cursors(self):
+        """Cursors walk the same ordering as page numbers"""
+        first = self.get_page()
+        second = self.get_page(before=encode_cursor(first[-1].pub_date, first[-1].pk))
+        self.assertEqual(list(second), self.posts[10:20])
+        self.assertTrue(second.has_previous())
+        third = self.get_page(before=second.next_cursor)
+        self.assertEqual(list(third), self.posts[20:])
+        self.assertFalse(third.has_next())
+        back = self.get_page(after=third.previous_cursor)
+        self.assertEqual(list(back), self.posts[10:20])
+
+    def test_same_pub_date_tie_break(self):
+        """Posts sharing pub_date are neither skipped nor repeated"""
+        Post.objects.update(pub_date=self.posts[0].pub_date)
+        seen = []
+        page = self.get_page(before=encode_cursor(self.posts[0].pub_date, 10**6))
+        while True:
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            page = self.get_page(before=page.next_cursor)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), 25)
+
+    def test_deep_page_links_by_cursor(self):
+        """Only the first pages are numbered, deeper links use cursors"""
+        for i in range(30):
+            Post.objects.create(text=f"Extra {i}", author=self.author)
+        page = self.get_page(page=5)
+        self.assertIsNotNone(page.next_cursor)
+        page = self.get_page(page=2)
+        self.assertIsNone(page.next_cursor)
+
+    def test_no_deep_page_numbers(self):
+        """Pages past the numbered ones are served by cursor, not OFFSET"""
+        for i in range(30):
+            Post.objects.create(text=f"Extra {i}", author=self.author)
+        posts = list(Post.objects.all())
+        page = self.get_page(page=5)
+        self.assertEqual(max(page.numbered_range[:-1]), 5)
+        page = self.get_page(page=9)
+        self.assertTrue(page.is_cursor)
+        self.assertEqual(list(page), posts[50:])
+
+    def test_invalid_cursor_falls_back(self):
+        """Garbage cursor shows the first page"""
+        page = self.get_page(before="not-a-cursor")
+        self.assertEqual(list(page), self.posts[:10])
+
+
+class TestCachedCounts(TestCase):
+    def setUp(self):
+        """Author with a couple of posts in a group"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        for i in range(3):
+            Post.objects.create(text=f"Post {i}", author=self.author, group=self.group)
+        self.client = Client()
+        cache.clear()
+
+    def test_count_is_stored(self):
+        """The first list view stores its size, later ones read it"""
+        response = self.client.get(reverse("group_url", args=[self.group.slug]))
+        self.assertEqual(response.context["paginator"].count, 3)
+        counter = PostCounter.objects.get(key=f"group:{self.group.pk}")
+        self.assertEqual(counter.count, 3)
+        counter.count = 42
+        counter.save()
+        paginator = CachedCountPaginator(
+            self.group.group_posts.all(), 10, count_key=counter.key
+        )
+        self.assertEqual(paginator.count, 42)
+
+    def test_new_post_invalidates(self):
+        """Creating or deleting a post drops the counters it belongs to"""
+        self.client.get(reverse("index"))
+        self.client.get(reverse("profile", args=[self.author.username]))
+        self.assertEqual(PostCounter.objects.count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(text="One more", author=self.author)
+        self.assertEqual(PostCounter.objects.count(), 0)
+        self.client.get(reverse("index"))
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(PostCounter.objects.filter(key="index").exists())
+
+    def test_counters_dropped_after_commit(self):
+        """A count stored while the post is being written is dropped on commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="One more", author=self.author)
+            # размер, посчитанный до коммита, ещё без нового поста
+            PostCounter.objects.create(key="index", count=3)
+            self.assertTrue(PostCounter.objects.filter(key="index").exists())
+        self.assertFalse(PostCounter.objects.filter(key="index").exists())
+
+    def test_estimate_for_huge_lists(self):
+        """Lists above the threshold are counted only up to it"""
+        with mock.patch("posts.paginators.ESTIMATE_THRESHOLD", 2):
+            paginator = CachedCountPaginator(Post.objects.all(), 1, count_key="index")
+            self.assertEqual(paginator.count, 2)
+            self.assertTrue(paginator.count_is_estimate)
+
+    def test_page_links_are_bounded(self):
+        """Elided page range stays small however many pages there are"""
+        paginator = CachedCountPaginator(Post.objects.all(), 1)
+        paginator.count = 50000
+        links = paginator.page_links(1)
+        self.assertEqual(links, [1, 2, 3, 4, 5, paginator.ELLIPSIS])
+        links = paginator.page_links(20000)
+        self.assertLessEqual(len(links), 12)
+        self.assertIn(20000, links)
+
+
+class TestCommentCount(TestCase):
+    def setUp(self):
+        """Post with a commenting reader"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.post = Post.objects.create(text="Post", author=self.author)
+        self.client = Client()
+        self.client.force_login(self.author)
+        cache.clear()
+
+    def comment(self, post=None):
+        return Comment.objects.create(
+            post=post or self.post, author=self.author, text="Comment"
+        )
+
+    def test_counter_follows_comments(self):
+        """Adding and deleting comments keeps comment_count in sync"""
+        self.client.post(
+            reverse("add_comment", args=[self.author.username, self.post.pk]),
+            {"text": "Commenting"},
+        )
+        comment = self.comment()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_reconcile_command(self):
+        """reconcile_comment_counts fixes drifted counters"""
+        self.comment()
+        Post.objects.update(comment_count=7)
+        call_command("reconcile_comment_counts", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_no_queries_per_post(self):
+        """Index page query count does not depend on the number of posts"""
+        self.comment()
+        self.client.get(reverse("index"))
+        cache.clear()
+        with CaptureQueriesContext(connection) as one_post:
+            self.client.get(reverse("index"))
+        for _ in range(5):
+            self.comment(Post.objects.create(text="More", author=self.author))
+        cache.clear()
+        self.client.get(reverse("index"))
+        cache.clear()
+        with CaptureQueriesContext(connection) as many_posts:
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "1 комментариев")
+        self.assertEqual(self.db_queries(one_post), self.db_queries(many_posts))
+
+    def db_queries(self, captured):
+        # запросы к таблице кэша зависят от прогретости кэша, не считаем их
+        return len(
+            [
+                query
+                for query in captured
+                if "cache_table" not in query["sql"] and "SAVEPOINT" not in query["sql"]
+            ]
+        )
+
+
+class TestProfileStats(TestCase):
+    def setUp(self):
+        """Two users, one of them with a post"""
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.post = Post.objects.create(text="Post", author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def stats(self, user):
+        return ProfileStats.objects.get(pk=user.pk)
+
+    def test_follow_and_posts_update_stats(self):
+        """Follow, unfollow and posting keep counters current"""
+        self.client.get(reverse("profile_follow", args=[self.author.username]))
+        self.assertEqual(self.stats(self.author).followers, 1)
+        self.assertEqual(self.stats(self.reader).following, 1)
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.client.post(reverse("new_post"), {"text": "Reader's post"})
+        self.assertEqual(self.stats(self.reader).posts, 1)
+        self.client.get(reverse("profile_unfollow", args=[self.author.username]))
+        self.assertEqual(self.stats(self.author).followers, 0)
+        self.assertEqual(self.stats(self.reader).following, 0)
+
+    def test_profile_reads_stats(self):
+        """Profile page shows the stats row without counting"""
+        self.client.get(reverse("profile", args=[self.author.username]))
+        ProfileStats.objects.filter(pk=self.author.pk).update(followers=77)
+        cache.clear()
+        response = self.client.get(reverse("profile", args=[self.author.username]))
+        self.assertContains(response, "Подписчиков: 77")
+
+    def test_recompute_command(self):
+        """recompute_profile_stats restores the real numbers"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        ProfileStats.objects.update(followers=5, following=5, posts=5)
+        call_command("recompute_profile_stats", stdout=StringIO())
+        self.assertEqual(
+            (self.stats(self.author).followers, self.stats(self.author).posts), (1, 1)
+        )
+        self.assertEqual(self.stats(self.reader).following, 1)
+
+
+class TestPostCards(TestCase):
+    def setUp(self):
+        """Author, reader and a post"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.post = Post.objects.create(text="Cached card", author=self.author)
+        self.client = Client()
+        cache.clear()
+
+    def test_card_is_reused(self):
+        """A cached card is served without rendering the template again"""
+        self.client.get(reverse("index"))
+        key = caching.card_key(Post.objects.get(pk=self.post.pk))
+        cache.set(key, "<p>from cache</p>")
+        response = self.client.get(reverse("profile", args=[self.author.username]))
+        self.assertContains(response, "from cache")
+
+    def test_card_key_changes_on_edit_and_comment(self):
+        """Editing a post or commenting it gives the card a new key"""
+        key = caching.card_key(self.post)
+        self.post.text = "Edited"
+        self.post.save()
+        self.assertNotEqual(caching.card_key(self.post), key)
+        key = caching.card_key(self.post)
+        Comment.objects.create(post=self.post, author=self.reader, text="Hi")
+        self.post.refresh_from_db()
+        self.assertNotEqual(caching.card_key(self.post), key)
+
+    def test_author_rename_refreshes_cards_and_profile(self):
+        """Renaming the author gives cards and profile pages new versions"""
+        self.client.get(reverse("index"))
+        self.client.get(reverse("profile", args=[self.author.username]))
+        key = caching.card_key(self.post)
+        profile = caching.generations(caching.profile_scope("writer"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = "Lev"
+            self.author.save()
+        self.assertNotEqual(caching.card_key(self.post), key)
+        self.assertNotEqual(
+            caching.generations(caching.profile_scope("writer")), profile
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = "author"
+            self.author.save()
+        response = self.client.get(reverse("index"))
+        self.assertContains(
+            response, reverse("post_single", args=["author", self.post.pk])
+        )
+
+    def test_login_keeps_cards(self):
+        """Saving only the last login does not drop cached pages"""
+        stamps = caching.generations(caching.GLOBAL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username="writer", password="12345")
+        self.assertEqual(caching.generations(caching.GLOBAL), stamps)
+
+    def test_edit_link_only_for_author(self):
+        """Shared card gets the edit link for its author only"""
+        edit_url = reverse("post_edit", args=[self.author.username, self.post.pk])
+        self.client.force_login(self.reader)
+        self.assertNotContains(self.client.get(reverse("index")), edit_url)
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(reverse("index")), edit_url)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TestCacheStampede(TestCase):
+    def setUp(self):
+        """A slow page counting its renders"""
+        cache.clear()
+        self.renders = 0
+        self.lock = threading.Lock()
+
+        def slow_view(request):
+            with self.lock:
+                self.renders += 1
+            time.sleep(0.2)
+            return HttpResponse(f"render {self.renders}")
+
+        self.view = caching.cache_page_versioned("slow")(slow_view)
+        self.factory = RequestFactory()
+
+    def get(self):
+        request = self.factory.get("/slow/")
+        request.user = AnonymousUser()
+        return self.view(request)
+
+    def get_concurrently(self, count=8):
+        with ThreadPoolExecutor(count) as pool:
+            return list(pool.map(lambda _: self.get(), range(count)))
+
+    def test_concurrent_misses_render_once(self):
+        """Simultaneous misses wait for a single render"""
+        responses = self.get_concurrently()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual({response.content for response in responses}, {b"render 1"})
+
+    def test_stale_page_served_while_rendering(self):
+        """After invalidation one request renders, others get the old page"""
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.bump(caching.GLOBAL)
+        responses = self.get_concurrently()
+        self.assertEqual(self.renders, 2)
+        contents = {response.content for response in responses}
+        self.assertEqual(contents, {b"render 1", b"render 2"})
+
+    def test_bump_waits_for_commit(self):
+        """Pages rendered before the commit are not cached as the new ones"""
+        self.get()
+        stamps = caching.generations(caching.GLOBAL)
+        with self.captureOnCommitCallbacks() as callbacks:
+            caching.bump(caching.GLOBAL)
+            self.assertEqual(caching.generations(caching.GLOBAL), stamps)
+            self.assertEqual(self.get().content, b"render 1")
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(caching.generations(caching.GLOBAL), stamps)
+        self.assertEqual(self.get().content, b"render 2")
+
+    def test_early_refresh_near_expiry(self):
+        """Entries about to expire are refreshed before they do"""
+        self.get()
+        request = self.factory.get("/slow/")
+        request.user = AnonymousUser()
+        key = caching.page_key(request, "slow")
+        entry = cache.get(key)
+        entry["fresh_until"] = time.time() + 0.01
+        cache.set(key, entry)
+        with mock.patch("posts.caching.random.random", return_value=0.5):
+            self.get()
+        self.assertEqual(self.renders, 2)
+        self.get()
+        self.assertEqual(self.renders, 2)
+
+
+class TestWarmCaches(TransactionTestCase):
+    def setUp(self):
+        """Posts in a group and a followed author"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        for number in range(15):
+            Post.objects.create(
+                text=f"Post {number}", author=self.author, group=self.group
+            )
+        Follow.objects.create(user=reader, author=self.author)
+        cache.clear()
+
+    def test_hot_pages_are_cached(self):
+        """After warming anonymous visitors get cached pages"""
+        out = StringIO()
+        # тестовая база в памяти не выдерживает параллельной записи
+        call_command(
+            "warm_caches", "--host", "testserver", "--workers", "1", stdout=out
+        )
+        self.assertIn("Warmed 4 page(s)", out.getvalue())
+        for url in (
+            reverse("index"),
+            reverse("index") + "?page=2",
+            reverse("group_url", args=[self.group.slug]),
+            reverse("profile", args=[self.author.username]),
+        ):
+            with self.subTest(url=url):
+                self.assertIsNone(Client().get(url).context)
+
+    def test_time_budget(self):
+        """Nothing is rendered once the budget is spent"""
+        out = StringIO()
+        call_command("warm_caches", "--budget", "0", stdout=out)
+        self.assertIn("skipped 4", out.getvalue())
+        self.assertIsNotNone(Client().get(reverse("index")).context)
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        """An author with a post and a logged in reader"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.post = Post.objects.create(text="Post", author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.post_url = reverse(
+            "post_single", args=[self.author.username, self.post.pk]
+        )
+        cache.clear()
+
+    def revalidate(self, url):
+        etag = self.client.get(url)["ETag"]
+        with mock.patch("posts.views.render") as render:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, render
+
+    def test_not_modified(self):
+        """Current validators are answered with 304 without rendering"""
+        urls = (
+            reverse("index"),
+            reverse("profile", args=[self.author.username]),
+            reverse("follow_index"),
+            self.post_url,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response, render = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                render.assert_not_called()
+
+    def test_validators_change(self):
+        """Comments and follows give new validators"""
+        etag = self.client.get(self.post_url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.reader, text="Hi")
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Hi")
+
+        etag = self.client.get(reverse("follow_index"))["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(reverse("follow_index"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Post")
+
+    def test_validators_per_user(self):
+        """Another user does not reuse the reader's version"""
+        etag = self.client.get(reverse("index"))["ETag"]
+        response = Client().get(reverse("index"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestThumbnails(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """A logged in author"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.client = Client()
+        self.client.force_login(self.author)
+        cache.clear()
+
+    def upload(self, name="photo.jpg", size=(1200, 800)):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "JPEG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def test_upload_schedules_generation(self):
+        """Saving a new image queues thumbnails after commit"""
+        with mock.patch("posts.thumbnails._executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse("new_post"), {"text": "Photo", "image": self.upload()}
+                )
+            post = Post.objects.get()
+            executor.submit.assert_called_once_with(
+                thumbnails._generate_in_background, post.pk
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse("post_edit", args=[self.author.username, post.pk]),
+                    {"text": "Only text changed"},
+                )
+            executor.submit.assert_called_once()
+
+    def test_generated_srcset_is_rendered(self):
+        """Cards use the prebuilt srcset instead of sorl"""
+        post = Post.objects.create(text="Photo", author=self.author)
+        post.image = self.upload()
+        post.save()
+        manifest = thumbnails.generate(post.pk)
+        for width in thumbnails.WIDTHS:
+            self.assertIn(f"{width}w", manifest["webp"])
+            self.assertIn(f"{width}w", manifest["jpeg"])
+        path = os.path.join(
+            settings.MEDIA_ROOT,
+            thumbnails.thumbnail_name(post.image.name, 480, 170, "webp"),
+        )
+        with Image.open(path) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (480, 170)))
+        with mock.patch("sorl.thumbnail.templatetags.thumbnail.get_thumbnail") as sorl:
+            response = self.client.get(reverse("index"))
+        sorl.assert_not_called()
+        self.assertContains(response, manifest["src"])
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_backfill_command(self):
+        """generate_thumbnails fills in posts without a manifest"""
+        Post.objects.create(text="Text only", author=self.author)
+        post = Post.objects.create(text="Photo", author=self.author)
+        post.image = self.upload()
+        post.save()
+        out = StringIO()
+        call_command("generate_thumbnails", stdout=out)
+        self.assertIn("1 post(s)", out.getvalue())
+        self.assertTrue(Post.objects.get(pk=post.pk).thumbnails)
+
+    def test_image_dimensions_are_stored(self):
+        """Size of the original is saved with the post and reused by cards"""
+        self.client.post(reverse("new_post"), {"text": "Photo", "image": self.upload()})
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (1200, 800))
+        self.client.post(
+            reverse("post_edit", args=[self.author.username, post.pk]),
+            {"text": "Only text changed"},
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (1200, 800))
+        cache.clear()
+        with mock.patch("django.core.files.storage.FileSystemStorage.open") as open_:
+            response = self.client.get(reverse("index"))
+        open_.assert_not_called()
+        self.assertContains(response, 'width="1200" height="800"')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestImageUploads(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """A logged in author"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def upload(self, image, image_format="JPEG", **options):
+        buffer = BytesIO()
+        image.save(buffer, image_format, **options)
+        return SimpleUploadedFile(f"upload.{image_format.lower()}", buffer.getvalue())
+
+    def post_image(self, upload):
+        return self.client.post(reverse("new_post"), {"text": "Photo", "image": upload})
+
+    def image_error(self, response):
+        return response.context["form"].errors["image"][0]
+
+    def test_large_image_is_normalized(self):
+        """Oversized photos are shrunk, rotated upright and lose EXIF"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повёрнут на 90°
+        exif[0x010F] = "Camera"
+        self.post_image(self.upload(Image.new("RGB", (3000, 2000)), exif=exif))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1707, 2560))
+            self.assertNotIn("exif", image.info)
+        self.assertEqual((post.image_width, post.image_height), (1707, 2560))
+
+    def test_too_many_pixels(self):
+        """Images over the pixel limit are refused before decoding"""
+        upload = self.upload(Image.new("RGB", (100, 100)), "PNG")
+        with mock.patch("posts.uploads.MAX_IMAGE_PIXELS", 5000), mock.patch(
+            "posts.uploads.Image.Image.load"
+        ) as load:
+            response = self.post_image(upload)
+        load.assert_not_called()
+        self.assertIn("Слишком большое изображение", self.image_error(response))
+        self.assertFalse(Post.objects.exists())
+
+    def test_upload_size_limit(self):
+        """Files over the size limit are cut off by the upload handler"""
+        upload = self.upload(Image.effect_noise((200, 200), 50), "PNG")
+        with mock.patch("posts.uploads.MAX_UPLOAD_SIZE", 1000):
+            response = self.post_image(upload)
+        self.assertIn("Файл слишком большой", self.image_error(response))
+
+    def test_unsupported_format(self):
+        """Formats other than JPEG, PNG, GIF and WebP are refused"""
+        response = self.post_image(self.upload(Image.new("RGB", (10, 10)), "BMP"))
+        self.assertIn("JPEG, PNG, GIF или WebP", self.image_error(response))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestMediaStorage(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """A logged in author and an image"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.client = Client()
+        self.client.force_login(self.author)
+        buffer = BytesIO()
+        Image.new("RGB", (100, 50), "blue").save(buffer, "PNG")
+        self.image = buffer.getvalue()
+
+    def publish(self, name):
+        upload = SimpleUploadedFile(name, self.image)
+        self.client.post(reverse("new_post"), {"text": name, "image": upload})
+        return Post.objects.get(text=name)
+
+    def test_identical_uploads_share_a_file(self):
+        """The same picture is stored once, under its content hash"""
+        first = self.publish("first.png")
+        second = self.publish("second.png")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r"^posts/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_gc_removes_unreferenced_files(self):
+        """gc_media deletes old files of no post and keeps the rest"""
+        post = self.publish("kept.png")
+        storage = post.image.storage
+        orphan = storage.save("posts/orphan.png", BytesIO(b"orphan"))
+        fresh = storage.save("posts/fresh.png", BytesIO(b"fresh"))
+        thumbnail = thumbnails.thumbnail_name(orphan, 320, 113, "jpg")
+        kept_thumbnail = thumbnails.thumbnail_name(post.image.name, 320, 113, "jpg")
+        for name in (thumbnail, kept_thumbnail):
+            default_storage.save(name, BytesIO(b"thumbnail"))
+        day_ago = time.time() - 60 * 60 * 25
+        for name in (orphan, thumbnail, kept_thumbnail, post.image.name):
+            os.utime(storage.path(name), (day_ago, day_ago))
+
+        out = StringIO()
+        call_command("gc_media", stdout=out)
+        self.assertIn("Deleted 2 file(s)", out.getvalue())
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(default_storage.exists(thumbnail))
+        for name in (fresh, kept_thumbnail, post.image.name):
+            self.assertTrue(storage.exists(name))
+
+
+class TestQueryPlans(TestCase):
+    def setUp(self):
+        """Posts in a group, comments and follows"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        for number in range(15):
+            post = Post.objects.create(
+                text=f"Post {number}", author=self.author, group=self.group
+            )
+        self.post = post
+        for number in range(3):
+            Comment.objects.create(post=post, author=self.reader, text=f"{number}")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def ordered_queries(self, url, table):
+        """SQL of the view's ordered queries on the table"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        ordered = [
+            query["sql"]
+            for query in queries.captured_queries
+            if f'FROM "{table}"' in query["sql"] and "ORDER BY" in query["sql"]
+        ]
+        self.assertTrue(ordered, f"{url} made no ordered queries on {table}")
+        return ordered
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return " / ".join(row[-1] for row in cursor.fetchall())
+
+    def plans(self, url, table):
+        """Query plans of the view's ordered queries on the table"""
+        return [self.explain(sql) for sql in self.ordered_queries(url, table)]
+
+    def test_list_views_scan_indexes(self):
+        """List views read in index order, without sorting"""
+        cases = (
+            (reverse("index"), "posts_post", "posts_post_feed_idx"),
+            (reverse("index") + "?page=2", "posts_post", "posts_post_feed_idx"),
+            (
+                reverse("group_url", args=[self.group.slug]),
+                "posts_post",
+                "posts_post_group_idx",
+            ),
+            (
+                reverse("profile", args=[self.author.username]),
+                "posts_post",
+                "posts_post_author_idx",
+            ),
+            (
+                reverse("post_single", args=[self.author.username, self.post.pk]),
+                "posts_comment",
+                "posts_comment_post_idx",
+            ),
+        )
+        for url, table, index in cases:
+            with self.subTest(url=url):
+                for plan in self.plans(url, table):
+                    self.assertRegex(plan, rf"USING (COVERING )?INDEX {index}\b")
+                    self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_cursor_pages_seek(self):
+        """Cursor pages start with an index search, not a scan from the top"""
+        cursor = encode_cursor(self.post.pub_date, self.post.pk)
+        cases = (
+            ("index", [], "posts_post", "posts_post_feed_idx"),
+            ("group_url", [self.group.slug], "posts_post", "posts_post_group_idx"),
+            ("profile", [self.author.username], "posts_post", "posts_post_author_idx"),
+            ("follow_index", [], "posts_timelineentry", "posts_timeline_feed_idx"),
+        )
+        for name, args, table, index in cases:
+            for param in ("before", "after"):
+                url = f"{reverse(name, args=args)}?{param}={cursor}"
+                with self.subTest(url=url):
+                    for sql in self.ordered_queries(url, table):
+                        # старые SQLite находят границу только в отдельном
+                        # условии рядом с OR, новые — и в самом OR
+                        self.assertRegex(sql, rf'\) AND "{table}"\."pub_date" [<>]= ')
+                        plan = self.explain(sql)
+                        self.assertRegex(
+                            plan,
+                            rf"SEARCH {table} USING (COVERING )?INDEX {index} "
+                            r"\(.*pub_date[<>]\?\)",
+                        )
+                        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_follow_lookups_use_indexes(self):
+        """Follow rows are found by (user, author) and by author"""
+        by_user = Follow.objects.filter(user=self.reader, author=self.author)
+        self.assertRegex(by_user.explain(), r"USING (COVERING )?INDEX \w+_uniq")
+        followers = Follow.objects.filter(author=self.author).values("user")
+        self.assertRegex(
+            followers.explain(), r"USING COVERING INDEX posts_follow_author_idx"
+        )
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        """Posts of two authors, one of them in a group"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.other = User.objects.create_user(username="other", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        self.best = Post.objects.create(
+            text="Кошка, кошка и ещё раз кошка", author=self.author, group=self.group
+        )
+        self.once = Post.objects.create(
+            text="Про кошку и собаку, но больше про собаку", author=self.other
+        )
+        self.unrelated = Post.objects.create(text="Совсем другое", author=self.author)
+        self.client = Client()
+
+    def found(self, query, **filters):
+        response = self.client.get(reverse("search"), {"q": query, **filters})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["page"])
+
+    def test_ranking_and_prefixes(self):
+        """Words match as prefixes, best matches come first"""
+        self.assertEqual(self.found("кошк"), [self.best, self.once])
+        self.assertEqual(self.found("кошк собак"), [self.once])
+        self.assertEqual(self.found("!!!"), [])
+
+    def test_filters(self):
+        """Search can be narrowed to a group or an author"""
+        self.assertEqual(self.found("кошк", group="group"), [self.best])
+        self.assertEqual(self.found("кошк", author="other"), [self.once])
+
+    def test_index_follows_edits(self):
+        """Edited and deleted posts are reindexed by triggers"""
+        self.unrelated.text = "Теперь и тут кошка"
+        self.unrelated.save()
+        self.assertIn(self.unrelated, self.found("кошка"))
+        self.best.delete()
+        self.assertEqual(self.found("ещё"), [])
+        self.assertEqual(self.found("другое"), [])
+
+    def test_pages_keep_query(self):
+        """Page links carry the search query"""
+        for number in range(12):
+            Post.objects.create(text=f"Кошка {number}", author=self.author)
+        response = self.client.get(reverse("search"), {"q": "кошка"})
+        self.assertContains(response, "?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0&amp;page=2")
+
+    def test_api(self):
+        """The API returns matches as JSON and rejects empty queries"""
+        response = self.client.get(reverse("search_api"), {"q": "собак"})
+        data = response.json()
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(data["results"][0]["id"], self.once.pk)
+        self.assertEqual(data["results"][0]["author"], "other")
+        response = self.client.get(reverse("search_api"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_uses_index(self):
+        """Admin search goes through the full-text index"""
+        admin = User.objects.create_superuser("admin", "a@example.com", "12345")
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("admin:posts_post_changelist"), {"q": "собак"}
+            )
+        self.assertEqual(list(response.context["cl"].result_list), [self.once])
+        self.assertTrue(any("MATCH" in query["sql"] for query in queries))
+
+
+class TestJsonApi(TestCase):
+    def setUp(self):
+        """A dozen posts in a group, a follower and comments"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        for number in range(12):
+            self.post = Post.objects.create(
+                text=f"Post {number}", author=self.author, group=self.group
+            )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Lists are walked by next/previous links"""
+        first = self.client.get(reverse("api_index")).json()
+        self.assertEqual(len(first["results"]), 10)
+        self.assertEqual(first["results"][0]["text"], "Post 11")
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(
+            [row["text"] for row in second["results"]], ["Post 1", "Post 0"]
+        )
+        self.assertIsNone(second["next"])
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_sparse_fields(self):
+        """Only the requested fields are returned, unknown ones are rejected"""
+        url = reverse("api_group", args=["group"])
+        data = self.client.get(url, {"fields": "id,author"}).json()
+        self.assertEqual(data["results"][0], {"id": self.post.pk, "author": "writer"})
+        next_page = self.client.get(data["next"]).json()
+        self.assertEqual(set(next_page["results"][0]), {"id", "author"})
+        response = self.client.get(url, {"fields": "id,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def count_queries(self, url, params=None):
+        # первый запрос заводит штампы кэша, считаем второй
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        return len(queries)
+
+    def test_fixed_number_of_queries(self):
+        """Query count does not depend on the number of rows"""
+        self.client.force_login(self.reader)
+        urls = [
+            reverse("api_index"),
+            reverse("api_profile", args=["writer"]),
+            reverse("api_follow"),
+            reverse("api_post", args=["writer", self.post.pk]),
+        ]
+        Comment.objects.create(post=self.post, author=self.reader, text="Hi")
+        few = [self.count_queries(url) for url in urls]
+        for number in range(5):
+            Post.objects.create(text=f"More {number}", author=self.author)
+            Comment.objects.create(post=self.post, author=self.author, text="Hi")
+        many = [self.count_queries(url) for url in urls]
+        self.assertEqual(few, many)
+
+    def test_follow_feed(self):
+        """The follow feed needs a login and lists followed authors"""
+        self.assertEqual(self.client.get(reverse("api_follow")).status_code, 401)
+        self.client.force_login(self.reader)
+        data = self.client.get(reverse("api_follow"), {"fields": "id,group"}).json()
+        self.assertEqual(data["results"][0], {"id": self.post.pk, "group": "group"})
+
+    def test_post_with_comments(self):
+        """A post comes with its comments and their authors"""
+        for text in ("First", "Second"):
+            Comment.objects.create(post=self.post, author=self.reader, text=text)
+        url = reverse("api_post", args=["writer", self.post.pk])
+        data = self.client.get(url).json()
+        self.assertEqual(data["comment_count"], 2)
+        self.assertEqual(
+            [(c["author"], c["text"]) for c in data["comments"]],
+            [("reader", "First"), ("reader", "Second")],
+        )
+        data = self.client.get(url, {"fields": "text"}).json()
+        self.assertEqual(data, {"text": self.post.text})
+        response = self.client.get(reverse("api_post", args=["reader", self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestAsyncViews(TransactionTestCase):
+    def setUp(self):
+        """Posts in a group, a follower and a comment"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        for number in range(12):
+            self.post = Post.objects.create(
+                text=f"Post {number}", author=self.author, group=self.group
+            )
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader, text="Comment")
+        cache.clear()
+
+    def get(self, view, *args, **params):
+        request = RequestFactory().get("/", params)
+        request.user = self.reader
+        request.session = {}
+        if asyncio.iscoroutinefunction(view):
+            view = async_to_sync(view)
+        response = view(request, *args)
+        # страницы кэшируются под общими ключами — каждый раз считаем заново
+        cache.clear()
+        return re.sub(rb'name="csrfmiddlewaretoken" value="\w+"', b"", response.content)
+
+    def test_same_pages_as_sync_views(self):
+        """Async variants render exactly what the sync views do"""
+        cases = (
+            ("index", ()),
+            ("group_posts", ("group",)),
+            ("profile", ("writer",)),
+            ("post_view", ("writer", self.post.pk)),
+            ("follow_index", ()),
+        )
+        for name, args in cases:
+            for params in ({}, {"page": 2}):
+                with self.subTest(view=name, params=params):
+                    self.assertEqual(
+                        self.get(getattr(async_views, name), *args, **params),
+                        self.get(getattr(views, name), *args, **params),
+                    )
+
+    def test_decorated_views_run_concurrently(self):
+        """Sync decorators do not make the views queue for one thread"""
+
+        async def requests():
+            arrived = []
+            everyone = asyncio.Event()
+
+            @async_views.async_aware(lambda view: view)
+            async def view(request):
+                arrived.append(request)
+                if len(arrived) == 4:
+                    everyone.set()
+                await asyncio.wait_for(everyone.wait(), 5)
+                return HttpResponse()
+
+            await asyncio.gather(*[view(number) for number in range(4)])
+
+        async_to_sync(requests)()
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_more_requests_than_decorator_threads(self):
+        """Decorated views do not wait for each other's decorator threads"""
+
+        def request():
+            request = RequestFactory().get("/")
+            request.user = self.reader
+            request.session = {}
+            return request
+
+        async def requests():
+            views = [async_views.follow_index, async_views.index]
+            await asyncio.wait_for(
+                asyncio.gather(*[views[i % 2](request()) for i in range(6)]), 10
+            )
+
+        with ThreadPoolExecutor(2) as executor, mock.patch.object(
+            async_views, "_decorator_executor", executor
+        ):
+            async_to_sync(requests)()
+
+    def test_independent_queries_run_concurrently(self):
+        """Follow status and profile stats are fetched at the same time"""
+        barrier = threading.Barrier(2, timeout=5)
+        profile_stats = counters.profile_stats
+
+        def following(request, author):
+            barrier.wait()
+            return True
+
+        def stats(author):
+            barrier.wait()
+            return profile_stats(author)
+
+        with mock.patch.object(async_views, "_following", following), mock.patch(
+            "posts.counters.profile_stats", stats
+        ):
+            content = self.get(async_views.profile, "writer")
+        self.assertIn("Отписаться".encode(), content)
+
+
+class TestLiveUpdates(TransactionTestCase):
+    def setUp(self):
+        """Posts in two groups and a follower"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        self.other = Group.objects.create(title="Other", slug="other")
+        self.post = Post.objects.create(
+            text="Post", author=self.author, group=self.group
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+
+    def events(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.addCleanup(response.close)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return (chunk.decode() for chunk in response.streaming_content)
+
+    def test_new_posts_of_feed(self):
+        """A group stream counts the posts above the cursor, only of the group"""
+        since = encode_cursor(self.post.pub_date, self.post.pk)
+        url = reverse("live_group", args=["group"])
+        page = self.client.get(reverse("group_url", args=["group"]))
+        self.assertContains(page, f'data-live-url="{url}?since={since}"')
+        events = self.events(f"{url}?since={since}")
+        self.assertEqual(next(events), "retry: 1000\n\n")
+        self.assertIn('data: {"count": 0, "more": false}', next(events))
+        with mock.patch.object(live, "HEARTBEAT_INTERVAL", 0.1):
+            Post.objects.create(text="Elsewhere", author=self.author, group=self.other)
+            self.assertEqual(next(events), ": ping\n\n")
+            Post.objects.create(text="New", author=self.author, group=self.group)
+            event = next(events)
+        self.assertIn(f"id: {since}\n", event)
+        self.assertIn('data: {"count": 1, "more": false}', event)
+
+    def test_writes_of_other_workers(self):
+        """Posts made by another process arrive through the shared cache"""
+        self.client.force_login(self.reader)
+        events = self.events(reverse("live_follow"))
+        next(events)
+        self.assertIn('"count": 0', next(events))
+        # в этом процессе о записи никто не узнает — только штамп в кэше
+        with mock.patch.object(caching.bumped, "send"):
+            Post.objects.create(text="New", author=self.author)
+        with mock.patch.object(live, "POLL_INTERVAL", 0.05):
+            self.assertIn('"count": 1', next(events))
+
+    def test_refusals(self):
+        """Anonymous follow streams, bad cursors and a full process"""
+        self.assertEqual(self.client.get(reverse("live_follow")).status_code, 401)
+        response = self.client.get(reverse("live_index"), {"since": "nonsense"})
+        self.assertEqual(response.status_code, 400)
+        with mock.patch.object(live, "_streams", threading.BoundedSemaphore(1)):
+            events = self.events(reverse("live_index"))
+            next(events)
+            busy = self.events(reverse("live_index"), HTTP_LAST_EVENT_ID="")
+            self.assertEqual(list(busy), ["retry: 30000\n\n"])
+
+
+class TestLoadMore(TestCase):
+    def setUp(self):
+        """Two dozen posts in a group and a follower"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        self.posts = [
+            Post.objects.create(
+                text=f"Post {number}", author=self.author, group=self.group
+            )
+            for number in range(24)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        cache.clear()
+
+    def test_fragments_follow_the_page(self):
+        """Every list links its fragments; they hold only the next cards"""
+        self.client.force_login(self.reader)
+        cursor = encode_cursor(self.posts[14].pub_date, self.posts[14].pk)
+        cases = (
+            ("index", "index_more", []),
+            ("group_url", "group_more", ["group"]),
+            ("profile", "profile_more", ["writer"]),
+            ("follow_index", "follow_more", []),
+        )
+        for page_name, name, args in cases:
+            with self.subTest(view=name):
+                url = reverse(name, args=args)
+                page = self.client.get(reverse(page_name, args=args))
+                self.assertContains(page, f'data-more-url="{url}?before={cursor}"')
+                response = self.client.get(url, {"before": cursor})
+                self.assertNotContains(response, "<nav")
+                self.assertContains(response, "Post 13")
+                self.assertContains(response, "Post 4")
+                self.assertNotContains(response, "Post 14")
+                next_cursor = response[views.NEXT_CURSOR_HEADER]
+                last = self.client.get(url, {"before": next_cursor})
+                self.assertContains(last, "Post 0")
+                self.assertNotIn(views.NEXT_CURSOR_HEADER, last)
+
+    def test_bad_cursor(self):
+        """A broken cursor is a client error, not the first page"""
+        response = self.client.get(reverse("index_more"), {"before": "nonsense"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestSyndicationFeeds(TestCase):
+    def setUp(self):
+        """Posts in a group"""
+        self.author = User.objects.create_user(username="writer", password="12345")
+        self.group = Group.objects.create(title="Group", slug="group")
+        for number in range(3):
+            Post.objects.create(
+                text=f"Post {number}", author=self.author, group=self.group
+            )
+        self.client = Client()
+        cache.clear()
+
+    def entries(self, response):
+        content = b"".join(response.streaming_content)
+        tree = ElementTree.fromstring(content)
+        if tree.tag == "rss":
+            return [item.findtext("title") for item in tree.iter("item")]
+        atom = "{http://www.w3.org/2005/Atom}"
+        return [entry.findtext(f"{atom}title") for entry in tree.iter(f"{atom}entry")]
+
+    def test_feeds(self):
+        """Every list has Atom and RSS feeds, linked from its page"""
+        cases = (
+            ("index", "feed_index", []),
+            ("group_url", "feed_group", ["group"]),
+            ("profile", "feed_profile", ["writer"]),
+        )
+        for page_name, name, args in cases:
+            for kind in syndication.FORMATS:
+                with self.subTest(feed=name, kind=kind):
+                    url = reverse(name, args=[kind, *args])
+                    page = self.client.get(reverse(page_name, args=args))
+                    self.assertContains(page, f'href="{url}"')
+                    response = self.client.get(url)
+                    self.assertTrue(response.streaming)
+                    self.assertEqual(
+                        self.entries(response), ["Post 2", "Post 1", "Post 0"]
+                    )
+        response = self.client.get(reverse("feed_index", args=["json"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_between_writes(self):
+        """The document is rendered once per write; pollers get a 304"""
+        url = reverse("feed_group", args=["atom", "group"])
+        first = self.client.get(url)
+        content = b"".join(first.streaming_content)
+        cached = self.client.get(url)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(cached.content, content)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text="Fresh", author=self.author, group=self.group)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200
+        )
+        self.assertEqual(self.entries(self.client.get(url))[0], "Fresh")
@@ -0,0 +1,135 @@
+"""Background pre-generation of post image thumbnails.
+
+When a post gets a new image, a worker thread builds the card crop
+(``WIDTH`` x ``HEIGHT``) and a few narrower copies in JPEG and WebP, and
+stores a manifest with the ready ``src``/``srcset`` values in
+``Post.thumbnails``. Cards render the manifest as is; until it is there
+they show the original, sized by ``Post.image_width``/``image_height``.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from yatube.routers import use_primary
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# размер картинки в карточке поста
+WIDTH, HEIGHT = 960, 339
+WIDTHS = (960, 720, 480, 320)
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+}
+WORKERS = 2
+
+_executor = ThreadPoolExecutor(WORKERS, thread_name_prefix="thumbnails")
+
+
+def _sizes():
+    return [(width, round(width * HEIGHT / WIDTH)) for width in WIDTHS]
+
+
+def thumbnail_name(image_name, width, height, extension):
+    stem = os.path.splitext(image_name)[0]
+    return f"thumbnails/{stem}_{width}x{height}.{extension}"
+
+
+def _crop(field):
+    with field.open("rb") as source:
+        image = Image.open(source)
+        # JPEG можно сразу декодировать в уменьшенном масштабе
+        image.draft("RGB", (WIDTH, HEIGHT))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    return ImageOps.fit(image, (WIDTH, HEIGHT), Image.LANCZOS)
+
+
+def build(post):
+    """Render all thumbnails of the post image, return their manifest."""
+    # картинки хранятся по хэшу, а превью — под предсказуемыми именами
+    storage = default_storage
+    crop = _crop(post.image)
+    manifest = {"width": WIDTH, "height": HEIGHT}
+    for key, (image_format, extension, options) in FORMATS.items():
+        srcset = []
+        for width, height in _sizes():
+            image = (
+                crop if width == WIDTH else crop.resize((width, height), Image.LANCZOS)
+            )
+            buffer = BytesIO()
+            image.save(buffer, image_format, **options)
+            name = thumbnail_name(post.image.name, width, height, extension)
+            # одно имя картинки — одно содержимое, превью можно перезаписать
+            storage.delete(name)
+            name = storage.save(name, ContentFile(buffer.getvalue()))
+            srcset.append(f"{storage.url(name)} {width}w")
+            if key == "jpeg" and width == WIDTH:
+                manifest["src"] = storage.url(name)
+        manifest[key] = ", ".join(srcset)
+    return manifest
+
+
+def generate(post_id, rebuild=False):
+    """Build and store the thumbnails of a post, unless its image changed.
+
+    Thumbnails of the same image made for another post are reused unless
+    ``rebuild`` is set.
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return None
+    # у такой же картинки другого поста превью уже могут быть готовы
+    manifest = None
+    if not rebuild:
+        manifest = (
+            Post.objects.filter(image=post.image.name)
+            .exclude(thumbnails={})
+            .values_list("thumbnails", flat=True)
+            .first()
+        )
+    manifest = manifest or build(post)
+    # новая версия карточки: меняем updated, чтобы сменился её ключ в кэше
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnails=manifest, updated=timezone.now()
+    )
+    if updated:
+        caching.bump_post(post.author_id, post.group_id)
+    return manifest
+
+
+def _generate_in_background(post_id):
+    try:
+        # пост только что сохранён и на реплики мог ещё не доехать
+        with use_primary():
+            generate(post_id)
+    except Exception:
+        logger.exception("Thumbnails of post %s failed", post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post):
+    """Queue thumbnail generation once the current transaction commits."""
+    transaction.on_commit(lambda: _executor.submit(_generate_in_background, post.pk))
+
+
+def save_post(form):
+    """Save a ``PostForm``; a new image gets its thumbnails in the background."""
+    image_changed = "image" in form.changed_data
+    if image_changed:
+        form.instance.thumbnails = {}
+    post = form.save()
+    if image_changed and post.image:
+        schedule(post)
+    return post
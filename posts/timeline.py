@@ -0,0 +1,68 @@
+"""Fan-out-on-write maintenance of the materialized "favorite authors" feed.
+
+Every follower gets its own ``TimelineEntry`` row per post, so reading the
+feed is a single range scan over ``(user, -pub_date)`` instead of a join
+through ``Follow``.
+"""
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Push a freshly created post into the timelines of its author's followers.
+
+    Returns the ids of the followers whose timelines got the post.
+    """
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    _insert(
+        [
+            TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+            for user_id in follower_ids
+        ]
+    )
+    return follower_ids
+
+
+def add_author(user_id, author_id):
+    """Backfill the user's timeline with every post of a newly followed author."""
+    posts = Post.objects.filter(author_id=author_id).values_list("pk", "pub_date")
+    batch = []
+    for post_id, pub_date in posts.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date))
+        if len(batch) >= BATCH_SIZE:
+            _insert(batch)
+            batch = []
+    if batch:
+        _insert(batch)
+
+
+def remove_author(user_id, author_id):
+    """Drop an unfollowed author's posts from the user's timeline."""
+    TimelineEntry.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_ids=None):
+    """Recreate timelines from ``Follow`` rows, for everybody or the given users."""
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    entries.delete()
+    rebuilt = 0
+    for user_id, author_id in follows.values_list("user_id", "author_id").iterator():
+        add_author(user_id, author_id)
+        rebuilt += 1
+    return rebuilt
@@ -0,0 +1,120 @@
+"""Bounded-memory handling of uploaded post images.
+
+Uploads are always streamed to a temporary file and cut off at
+``MAX_UPLOAD_SIZE``. ``validate_image`` checks the format and pixel count
+from the image header before anything is decoded, ``normalize`` re-encodes
+the picture no larger than ``MAX_IMAGE_SIDE`` with the orientation applied and
+EXIF (camera data, GPS) dropped. JPEGs are decoded already scaled down.
+"""
+
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+MAX_IMAGE_SIDE = 2560
+FORMATS = {
+    "JPEG": {"quality": 90, "optimize": True},
+    "PNG": {"optimize": True},
+    "GIF": {},
+    "WEBP": {"quality": 90},
+}
+EXTENSIONS = {"JPEG": "jpg"}
+
+# картинки больше 2×MAX_IMAGE_PIXELS Pillow откажется открывать где угодно,
+# в том числе при построении превью
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Stream every upload to disk and stop writing past ``MAX_UPLOAD_SIZE``.
+
+    The rest of an oversized file is discarded and the file is marked
+    ``too_large`` for the form to report, instead of aborting the request.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.too_large or start + len(raw_data) > MAX_UPLOAD_SIZE:
+            self.too_large = True
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.too_large = self.too_large
+        return file
+
+
+def too_large_message():
+    return f"Файл слишком большой, максимум {filesizeformat(MAX_UPLOAD_SIZE)}."
+
+
+def validate_image(data):
+    """Check size, format and pixel count of an upload from its header only.
+
+    The image is not decoded, so this is cheap even for huge files.
+    """
+    if getattr(data, "too_large", False) or data.size > MAX_UPLOAD_SIZE:
+        raise ValidationError(too_large_message(), code="file_too_large")
+    too_many_pixels = ValidationError(
+        "Слишком большое изображение, максимум %(pixels)s Мп.",
+        code="too_many_pixels",
+        params={"pixels": MAX_IMAGE_PIXELS // 10**6},
+    )
+    try:
+        with Image.open(data) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError as exc:
+        raise too_many_pixels from exc
+    finally:
+        data.seek(0)
+    if width * height > MAX_IMAGE_PIXELS:
+        raise too_many_pixels
+    if image_format not in FORMATS:
+        raise ValidationError(
+            "Загрузите картинку в формате JPEG, PNG, GIF или WebP.",
+            code="unsupported_format",
+        )
+
+
+def normalize(data):
+    """Re-encode an uploaded image: bounded size, upright, without EXIF."""
+    with Image.open(data) as image:
+        image_format = image.format
+        if getattr(image, "n_frames", 1) > 1:
+            # анимацию не перекодируем, чтобы не потерять кадры
+            data.seek(0)
+            return data
+        scale = min(MAX_IMAGE_SIDE / max(image.size), 1)
+        # JPEG декодируется сразу уменьшенным в 2, 4 или 8 раз
+        image.draft(image.mode, (int(image.width * scale), int(image.height * scale)))
+        icc_profile = image.info.get("icc_profile")
+        image = ImageOps.exif_transpose(image)
+        # thumbnail с reducing_gap сначала делает дешёвый reduce()
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS, 2.0)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        extension = EXTENSIONS.get(image_format, image_format.lower())
+        name = f"{os.path.splitext(data.name)[0]}.{extension}"
+        # до FILE_UPLOAD_MAX_MEMORY_SIZE в памяти, дальше — на диске
+        buffer = tempfile.SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        normalized = UploadedFile(buffer, name, Image.MIME[image_format])
+        options = dict(FORMATS[image_format])
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        # exif не передаём — метаданные не попадают в новый файл
+        image.save(normalized, image_format, **options)
+    normalized.size = normalized.tell()
+    normalized.seek(0)
+    return normalized
@@ -1,17 +1,42 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, live, syndication, views
+
+# ленты и страница поста: асинхронные варианты под ASGI (ASYNC_VIEWS=1)
+feeds = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("group/<slug:slug>/", views.group_posts, name="group_url"),
+    path("", feeds.index, name="index"),
+    path("group/<slug:slug>/", feeds.group_posts, name="group_url"),
     path("new/", views.new_post, name="new_post"),
     path("404/", views.page_not_found, name="e404"),
     path("500/", views.server_error, name="e500"),
-    path("follow/", views.follow_index, name="follow_index"),
+    path("follow/", feeds.follow_index, name="follow_index"),
+    path("search/", views.search, name="search"),
+    path("search/api/", views.search_api, name="search_api"),
+    path("more/", views.index_more, name="index_more"),
+    path("more/group/<slug:slug>/", views.group_more, name="group_more"),
+    path("more/follow/", views.follow_more, name="follow_more"),
+    path("more/<str:username>/", views.profile_more, name="profile_more"),
+    path("feeds/<str:kind>/", syndication.index, name="feed_index"),
+    path(
+        "feeds/<str:kind>/group/<slug:slug>/",
+        syndication.group_posts,
+        name="feed_group",
+    ),
+    path("feeds/<str:kind>/<str:username>/", syndication.profile, name="feed_profile"),
+    path("live/", live.index, name="live_index"),
+    path("live/group/<slug:slug>/", live.group_posts, name="live_group"),
+    path("live/follow/", live.follow_index, name="live_follow"),
+    path("api/posts/", api.index, name="api_index"),
+    path("api/group/<slug:slug>/", api.group_posts, name="api_group"),
+    path("api/follow/", api.follow_index, name="api_follow"),
+    path("api/<str:username>/", api.profile, name="api_profile"),
+    path("api/<str:username>/<int:post_id>/", api.post_view, name="api_post"),
     path("<str:username>/<int:post_id>/comment", views.add_comment, name="add_comment"),
-    path("<str:username>/", views.profile, name="profile"),
-    path("<str:username>/<int:post_id>/", views.post_view, name="post_single"),
+    path("<str:username>/", feeds.profile, name="profile"),
+    path("<str:username>/<int:post_id>/", feeds.post_view, name="post_single"),
     path("<str:username>/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"),
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
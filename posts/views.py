@@ -1,25 +1,83 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import router, transaction
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
-from django.views.decorators.cache import cache_page
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from . import caching, counters, thumbnails
+from .forms import CommentForm, PostForm, SearchForm
+from .models import Follow, Group, Post, TimelineEntry, User
+from .paginators import PAGE_SIZE, CursorPaginator, InvalidCursor, paginate
 
+# курсор следующего фрагмента «Показать ещё»; нет заголовка — список кончился
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-@cache_page(20, key_prefix="index_page")
+
+@caching.cache_page_versioned("index_page", lambda: [caching.INDEX])
 def index(request):
-    post_list = (
-        Post.objects.select_related("author", "group").order_by("-pub_date").all()
+    post_list = Post.objects.select_related("author", "group").all()
+
+    # первые страницы — по номеру (?page=N), дальше — по курсору (?before=...)
+    paginator, page = paginate(request, post_list, count_key=counters.INDEX)
+    return render(
+        request,
+        "posts/index.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": caching.get_cards(page),
+        },
     )
 
-    paginator = Paginator(post_list, 10)
-    # показывать по 10 записей на странице.
-    page_number = request.GET.get("page")
-    # переменная в URL с номером запрошенной страницы
-    page = paginator.get_page(page_number)
-    # получить записи с нужным смещением
-    return render(request, "posts/index.html", {"page": page, "paginator": paginator})
+
+def _more(request, object_list, keys=("pub_date", "id"), entries=False):
+    """Only the post cards of the page after ``?before=``, for "load more"."""
+    paginator = CursorPaginator(object_list, PAGE_SIZE, keys)
+    try:
+        page = paginator.page(before=request.GET.get("before"))
+    except InvalidCursor as error:
+        return HttpResponseBadRequest(str(error))
+    if entries:
+        page.object_list = [entry.post for entry in page.object_list]
+    response = render(
+        request,
+        "posts/includes/post_list.html",
+        {"page": page, "post_cards": caching.get_cards(page)},
+    )
+    if page.next_cursor:
+        response[NEXT_CURSOR_HEADER] = page.next_cursor
+    return response
+
+
+@caching.cache_page_versioned("index_more", lambda: [caching.INDEX])
+def index_more(request):
+    return _more(request, Post.objects.select_related("author", "group"))
+
+
+@caching.cache_page_versioned("group_more", lambda slug: [caching.group_scope(slug)])
+def group_more(request, slug):
+    group = get_object_or_404(Group.objects.only("pk"), slug=slug)
+    posts = Post.objects.filter(group_id=group.pk).select_related("author", "group")
+    return _more(request, posts)
+
+
+@caching.cache_page_versioned(
+    "profile_more", lambda username: [caching.profile_scope(username)]
+)
+def profile_more(request, username):
+    author = get_object_or_404(User.objects.only("pk"), username=username)
+    posts = Post.objects.filter(author_id=author.pk).select_related("author", "group")
+    return _more(request, posts)
+
+
+@login_required
+@caching.conditional(
+    lambda request: [caching.INDEX, caching.follow_scope(request.user.pk)]
+)
+def follow_more(request):
+    entries = TimelineEntry.objects.filter(user=request.user).select_related(
+        "post__author", "post__group"
+    )
+    return _more(request, entries, ("pub_date", "post_id"), entries=True)
 
 
 @login_required
@@ -37,16 +95,20 @@ def add_comment(request, username, post_id):
     return redirect(url)
 
 
+@caching.cache_page_versioned("group_page", lambda slug: [caching.group_scope(slug)])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.group_posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    posts = group.group_posts.select_related("author", "group").all()
+    paginator, page = paginate(request, posts, count_key=counters.group_key(group.pk))
     return render(
         request,
         "posts/group.html",
-        {"page": page, "paginator": paginator, "group": group},
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": caching.get_cards(page),
+            "group": group,
+        },
     )
 
 
@@ -55,19 +117,21 @@ def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == "POST" and form.is_valid():
         form.instance.author = request.user
-        form.save()
+        with transaction.atomic():
+            thumbnails.save_post(form)
         url = reverse("index")
         return redirect(url)
     labels = {"title": "Новая запись", "button": "Добавить новую запись"}
     return render(request, "posts/new_post.html", {"form": form, "labels": labels})
 
 
+@caching.cache_page_versioned(
+    "profile_page", lambda username: [caching.profile_scope(username)]
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related("stats"), username=username)
+    posts = author.posts.select_related("author", "group").all()
+    paginator, page = paginate(request, posts, count_key=counters.author_key(author.pk))
     following = False
     if request.user.is_authenticated:
         user = request.user
@@ -81,21 +145,38 @@ def profile(request, username):
         {
             "page": page,
             "paginator": paginator,
+            "post_cards": caching.get_cards(page),
             "author": author,
+            "stats": counters.profile_stats(author),
             "following": following,
         },
     )
 
 
+# правки поста и комментарии обновляют штамп профиля автора
+@caching.conditional(
+    lambda request, username, post_id: [caching.profile_scope(username)]
+)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"),
+        pk=post_id,
+        author__username=username,
+    )
     author = post.author
-    comments = post.comments.all()
+    # комментарии могут лежать в отдельной базе: авторы — вторым запросом
+    comments = post.comments.prefetch_related("author")
     form = CommentForm()
     return render(
         request,
         "posts/post.html",
-        {"post": post, "author": author, "form": form, "items": comments},
+        {
+            "post": post,
+            "author": author,
+            "stats": counters.profile_stats(author),
+            "form": form,
+            "items": comments,
+        },
     )
 
 
@@ -110,7 +191,7 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
 
     if request.POST and form.is_valid():
-        form.save()
+        thumbnails.save_post(form)
         return redirect(url)
 
     labels = {"title": "Редактировать запись", "button": "Сохранить"}
@@ -120,6 +201,55 @@ def post_edit(request, username, post_id):
     )
 
 
+def search(request):
+    form = SearchForm(request.GET or None)
+    results = form.search() if form.is_valid() else Post.objects.none()
+    # результаты упорядочены по релевантности, курсор по дате к ним не подходит
+    paginator, page = paginate(request, results, keys=None)
+    query = request.GET.copy()
+    query.pop("page", None)
+    return render(
+        request,
+        "posts/search.html",
+        {
+            "form": form,
+            "page": page,
+            "paginator": paginator,
+            "post_cards": caching.get_cards(page),
+            "query": query.urlencode(),
+        },
+    )
+
+
+def search_api(request):
+    form = SearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    paginator, page = paginate(request, form.search(), keys=None)
+    results = [
+        {
+            "id": post.pk,
+            "author": post.author.username,
+            "group": post.group.slug if post.group else None,
+            "text": post.text,
+            "pub_date": post.pub_date,
+            "url": reverse(
+                "post_single",
+                kwargs={"username": post.author.username, "post_id": post.pk},
+            ),
+        }
+        for post in page
+    ]
+    return JsonResponse(
+        {
+            "count": paginator.count,
+            "page": page.number,
+            "num_pages": paginator.num_pages,
+            "results": results,
+        }
+    )
+
+
 def page_not_found(request, exception):
     return render(request, "misc/404.html", {"path": request.path}, status=404)
 
@@ -129,24 +259,42 @@ def server_error(request):
 
 
 @login_required
+@caching.conditional(
+    lambda request: [caching.INDEX, caching.follow_scope(request.user.pk)]
+)
 def follow_index(request):
     logged = request.user
 
-    # 1. Get author object of post
-    # 2. Get posts "following" of author via related name
-    # 3. Where user = logged.
-    posts = Post.objects.filter(author__following__user=logged)
+    # лента заранее разложена по TimelineEntry при публикации и подписке,
+    # поэтому читаем её одним проходом по индексу (user, -pub_date)
+    entries = TimelineEntry.objects.filter(user=logged).select_related(
+        "post__author", "post__group"
+    )
 
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(
+        request,
+        entries,
+        keys=("pub_date", "post_id"),
+        count_key=counters.follow_key(logged.pk),
+    )
+    page.object_list = [entry.post for entry in page.object_list]
     return render(
         request,
         "posts/follow.html",
-        {"page": page, "paginator": paginator, "username": logged},
+        {
+            "page": page,
+            "paginator": paginator,
+            "post_cards": caching.get_cards(page),
+            "username": logged,
+        },
     )
 
 
+def _follows_atomic():
+    # подписки могут жить в своей базе (DATABASE_MODELS) — нужна и её транзакция
+    return transaction.atomic(using=router.db_for_write(Follow))
+
+
 @login_required
 def profile_follow(request, username):
     url = reverse("profile", args=[username])
@@ -156,7 +304,9 @@ def profile_follow(request, username):
         return redirect(url)
     if author == user:
         return redirect(url)
-    Follow.objects.create(user=user, author=author)
+    # подписка, лента и счётчики профилей меняются вместе
+    with transaction.atomic(), _follows_atomic():
+        Follow.objects.create(user=user, author=author)
     return redirect(url)
 
 
@@ -165,5 +315,6 @@ def profile_unfollow(request, username):
     url = reverse("profile", args=[username])
     user = request.user
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=user, author=author).delete()
+    with transaction.atomic(), _follows_atomic():
+        Follow.objects.filter(user=user, author=author).delete()
     return redirect(url)
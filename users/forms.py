@@ -1,10 +1,51 @@
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import Resolver404, get_resolver, resolve, reverse
+from django.urls.converters import IntConverter
+from django.urls.resolvers import URLResolver
 
 User = get_user_model()
 
 
+def _user_url_names(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace or namespace
+            yield from _user_url_names(pattern.url_patterns, inner)
+        elif pattern.name and "username" in pattern.pattern.converters:
+            name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+            yield name, pattern.pattern.converters
+
+
+def shadows_site_pages(username):
+    """Whether any page of the user would open another page of the site.
+
+    Every URL pattern with a ``username`` (profile, posts, API, feeds,
+    fragments) is reversed for the name and resolved back.
+    """
+    for name, converters in _user_url_names(get_resolver().url_patterns):
+        kwargs = {
+            key: 1 if isinstance(converter, IntConverter) else "x"
+            for key, converter in converters.items()
+        }
+        kwargs["username"] = username
+        try:
+            match = resolve(reverse(name, kwargs=kwargs))
+        except Resolver404:
+            return True
+        if match.view_name != name:
+            return True
+    return False
+
+
 class CreationForm(UserCreationForm):
     class Meta:
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data["username"]
+        if shadows_site_pages(username):
+            raise forms.ValidationError("Это имя занято адресом сайта")
+        return username
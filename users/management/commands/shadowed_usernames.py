@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from users.forms import shadows_site_pages
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "List users registered before a site page took their name "
+        "(their profile or posts open another page); rename them in the admin"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error if such users exist",
+        )
+
+    def handle(self, *args, **options):
+        shadowed = [
+            username
+            for username in User.objects.values_list("username", flat=True).iterator()
+            if shadows_site_pages(username)
+        ]
+        for username in shadowed:
+            self.stdout.write(username)
+        if shadowed and options["fail"]:
+            raise CommandError(f"{len(shadowed)} username(s) shadowed by site pages")
+        self.stdout.write(
+            self.style.SUCCESS(f"Found {len(shadowed)} shadowed username(s)")
+        )
@@ -0,0 +1,13 @@
+"""ASGI entry point, e.g. ``uvicorn yatube.asgi:application``.
+
+With ``ASYNC_VIEWS=1`` the feed pages are served by ``posts.async_views``:
+a slow query then holds a coroutine instead of a whole worker.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+
+application = get_asgi_application()
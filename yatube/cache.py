@@ -0,0 +1,260 @@
+"""Two-tier cache backend.
+
+A small per-process LRU layer sits in front of a shared cache (the database
+cache table, a file cache, ...) configured under another alias::
+
+    CACHES = {
+        "default": {
+            "BACKEND": "yatube.cache.TwoTierCache",
+            "LOCATION": "shared",
+            "OPTIONS": {
+                "MAX_ENTRIES": 1000,
+                "LOCAL_TIMEOUT": 5,
+                "MUTABLE_KEY_PREFIXES": ["generation:"],
+            },
+        },
+        "shared": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "cache_table",
+        },
+    }
+
+Every write of a mutable key (one starting with any of
+``MUTABLE_KEY_PREFIXES``; by default every key is) also stores a new epoch
+stamp in the shared tier. Workers compare the epoch once per request (and
+every ``VERSION_CHECK_INTERVAL`` seconds outside requests) and drop their
+local copies when it has moved, so invalidation reaches all workers.
+Keys named by their version, or holding it next to the value for readers
+to check, need no such announcement: a stale local copy of them lives
+``LOCAL_TIMEOUT`` at most.
+"""
+
+import pickle
+import threading
+import time
+
+from cachetools import LRUCache
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.signals import request_started
+from django.dispatch import receiver
+
+EPOCH_KEY = "two_tier_cache:epoch"
+
+# локальный уровень общий для всех потоков процесса
+_states = {}
+_states_lock = threading.Lock()
+
+
+class _LocalTier:
+    def __init__(self, shared_alias, max_entries, check_interval):
+        self.shared_alias = shared_alias
+        self.check_interval = check_interval
+        self.entries = LRUCache(maxsize=max_entries)
+        self.lock = threading.Lock()
+        self.epoch = None
+        self.checked_at = None
+        self.stats = dict.fromkeys(
+            ("local_hits", "local_misses", "shared_hits", "shared_misses"), 0
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def sync(self, force=False):
+        """Drop local entries if another worker has written since last check."""
+        now = time.monotonic()
+        if (
+            not force
+            and self.checked_at is not None
+            and now - self.checked_at < self.check_interval
+        ):
+            return
+        epoch = self.shared.get(EPOCH_KEY)
+        with self.lock:
+            self.checked_at = now
+            if epoch != self.epoch:
+                self.entries.clear()
+                self.epoch = epoch
+
+    def bump(self):
+        """Announce a write to the other workers."""
+        current = self.shared.get(EPOCH_KEY)
+        epoch = time.time_ns()
+        self.shared.set(EPOCH_KEY, epoch, None)
+        with self.lock:
+            if current != self.epoch:
+                self.entries.clear()
+            self.epoch = epoch
+            self.checked_at = time.monotonic()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            self.stats["local_hits" if entry else "local_misses"] += 1
+        if entry is None:
+            return False, None
+        return True, pickle.loads(entry[1])
+
+    def set(self, key, value, ttl):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, data)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def count(self, hits, misses):
+        with self.lock:
+            self.stats["shared_hits"] += hits
+            self.stats["shared_misses"] += misses
+
+
+@receiver(request_started)
+def _check_epochs(**kwargs):
+    for tier in list(_states.values()):
+        tier.sync(force=True)
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self._mutable_prefixes = tuple(options.get("MUTABLE_KEY_PREFIXES", [""]))
+        with _states_lock:
+            if location not in _states:
+                _states[location] = _LocalTier(
+                    location,
+                    self._max_entries,
+                    options.get("VERSION_CHECK_INTERVAL", 1),
+                )
+            self._tier = _states[location]
+
+    @property
+    def _shared(self):
+        return self._tier.shared
+
+    def _announce(self, *keys):
+        # эпоху меняют только изменяемые ключи: записи страниц, карточек и
+        # блокировок сбрасывали бы локальный уровень всех воркеров
+        if any(str(key).startswith(self._mutable_prefixes) for key in keys):
+            self._tier.bump()
+
+    def _local_ttl(self, timeout):
+        if timeout is None:
+            return self._local_timeout
+        return max(min(self._local_timeout, timeout), 0)
+
+    def stats(self):
+        """Hit/miss counters of both tiers in this process."""
+        with self._tier.lock:
+            return dict(self._tier.stats)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        self._tier.sync()
+        found, value = self._tier.get(local_key)
+        if found:
+            return value
+        sentinel = object()
+        value = self._shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._tier.count(0, 1)
+            return default
+        self._tier.count(1, 0)
+        self._tier.set(local_key, value, self._local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._tier.sync()
+        result = {}
+        missing = []
+        for key in keys:
+            found, value = self._tier.get(self.make_key(key, version=version))
+            if found:
+                result[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            shared = self._shared.get_many(missing, version=version)
+            self._tier.count(len(shared), len(missing) - len(shared))
+            for key, value in shared.items():
+                self._tier.set(
+                    self.make_key(key, version=version), value, self._local_timeout
+                )
+            result.update(shared)
+        return result
+
+    def has_key(self, key, version=None):
+        self._tier.sync()
+        found, _ = self._tier.get(self.make_key(key, version=version))
+        return found or self._shared.has_key(key, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # add не перезаписывает значения, поэтому эпоху не меняет
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        added = self._shared.add(key, value, timeout, version=version)
+        if added:
+            self._tier.set(
+                self.make_key(key, version=version), value, self._local_ttl(timeout)
+            )
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        self._shared.set(key, value, timeout, version=version)
+        self._announce(key)
+        self._tier.set(
+            self.make_key(key, version=version), value, self._local_ttl(timeout)
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        failed = self._shared.set_many(data, timeout, version=version)
+        self._announce(*data)
+        for key, value in data.items():
+            if key not in failed:
+                self._tier.set(
+                    self.make_key(key, version=version),
+                    value,
+                    self._local_ttl(timeout),
+                )
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self._shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self._shared.delete(key, version=version)
+        self._announce(key)
+        self._tier.delete(self.make_key(key, version=version))
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self._shared.delete_many(keys, version=version)
+        self._announce(*keys)
+        for key in keys:
+            self._tier.delete(self.make_key(key, version=version))
+
+    def incr(self, key, delta=1, version=None):
+        value = self._shared.incr(key, delta, version=version)
+        self._announce(key)
+        self._tier.delete(self.make_key(key, version=version))
+        return value
+
+    def clear(self):
+        self._shared.clear()
+        self._tier.bump()
+        with self._tier.lock:
+            self._tier.entries.clear()
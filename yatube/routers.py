@@ -0,0 +1,182 @@
+"""Database routing: split databases and read replicas.
+
+``settings.DATABASE_MODELS`` maps model labels (``posts.comment``) to the
+aliases of separate databases. Every SQLite file has its own write lock, so
+writes of those models stop waiting for writes to ``default``. Such models
+live only in their database; ``SplitRouter`` keeps them there.
+
+``settings.DATABASE_REPLICAS`` lists the aliases of read-only copies of
+``default`` (kept up to date by external replication, e.g. litestream).
+``ReplicaRouter`` sends reads to a random replica and writes to the primary.
+Replicas lag behind, so reads go to the primary:
+
+* for the rest of a request (or, outside requests, of a thread) once it
+  has written anything;
+* during unsafe requests (POST and the like);
+* for ``REPLICATION_LAG`` seconds after a write, by a cookie that
+  ``PrimaryPinMiddleware`` sets — a user sees their own writes at once;
+* inside ``with use_primary():``.
+
+The database cache and sessions are never read from replicas: their readers
+cannot tolerate lag.
+"""
+
+import asyncio
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = "default"
+PIN_COOKIE = "use_primary"
+PRIMARY_ONLY_APPS = {"django_cache", "sessions"}
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class _State:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# состояние запроса — в контексте: его видят и потоки sync_to_async
+# асинхронных представлений; вне запросов — своё у каждого потока
+_request_state = ContextVar("database_state", default=None)
+_thread = threading.local()
+
+
+def _state():
+    state = _request_state.get()
+    if state is None:
+        state = getattr(_thread, "state", None)
+        if state is None:
+            state = _thread.state = _State()
+    return state
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def split_databases():
+    return set(getattr(settings, "DATABASE_MODELS", {}).values())
+
+
+def home_database(app_label, model_name):
+    """Alias of the separate database of a model, ``None`` if it has none."""
+    label = f"{app_label}.{model_name}"
+    return getattr(settings, "DATABASE_MODELS", {}).get(label)
+
+
+def pinned():
+    state = _state()
+    return state.pinned or state.wrote
+
+
+def _note_write(model):
+    if model._meta.app_label not in PRIMARY_ONLY_APPS:
+        _state().wrote = True
+
+
+@contextmanager
+def use_primary(pin=True):
+    """Read from the primary inside the block; writes in it pin as usual."""
+    state = _State(pin)
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+class SplitRouter:
+    def db_for_read(self, model, **hints):
+        return home_database(model._meta.app_label, model._meta.model_name)
+
+    def db_for_write(self, model, **hints):
+        database = home_database(model._meta.app_label, model._meta.model_name)
+        if database:
+            _note_write(model)
+        return database
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # комментарий из своей базы ссылается на пост из основной
+        databases = {PRIMARY, *replicas(), *split_databases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        home = model_name and home_database(app_label, model_name)
+        if db in split_databases():
+            return bool(home) and home == db
+        if home:
+            return False
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS or pinned() or not replicas():
+            return PRIMARY
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        _note_write(model)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # реплики — копии основной базы, схему им приносит репликация
+        if db in replicas():
+            return False
+        return None
+
+
+class PrimaryPinMiddleware:
+    # под ASGI синхронный middleware держал бы общий поток sync_to_async до
+    # конца ответа, и запросы шли бы по одному
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # так Django узнаёт асинхронный middleware (как MiddlewareMixin)
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_primary(self._pinned(request)) as state:
+            response = self.get_response(request)
+            wrote = state.wrote
+        return self._remember(response, wrote)
+
+    async def __acall__(self, request):
+        # состояние в ContextVar: его видят и потоки sync_to_async ниже
+        with use_primary(self._pinned(request)) as state:
+            response = await self.get_response(request)
+            wrote = state.wrote
+        return self._remember(response, wrote)
+
+    def _pinned(self, request):
+        return request.method in UNSAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def _remember(self, response, wrote):
+        if wrote and replicas():
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICATION_LAG,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -14,10 +14,24 @@ ALLOWED_HOSTS = [
     "mtkv.ru",
 ]
 
+# небольшой кэш в памяти процесса перед общей для всех воркеров таблицей
+# (её создаёт createcachetable в entrypoint.sh)
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+        "BACKEND": "yatube.cache.TwoTierCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+            "LOCAL_TIMEOUT": 5,
+            # эпоху меняют только штампы поколений; прочие ключи версионные
+            "MUTABLE_KEY_PREFIXES": ["generation:"],
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "cache_table",
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    },
 }
 
 # Login
@@ -45,6 +59,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "yatube.routers.PrimaryPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -54,6 +69,8 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = "yatube.urls"
+# асинхронные варианты лент (posts/async_views.py) для запуска через ASGI
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS") == "1"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
@@ -84,6 +101,51 @@ DATABASES = {
     }
 }
 
+# комментарии и подписки (DB_SOCIAL), сессии (DB_SESSIONS) — в отдельных
+# файлах SQLite со своими блокировками записи; после включения нужно
+# "migrate --database social" (и "sessions"), для переноса данных достаточно
+# скопировать основной файл
+DATABASE_MODELS = {}
+SPLIT_DATABASES = {
+    "social": (os.environ.get("DB_SOCIAL"), ["posts.comment", "posts.follow"]),
+    "sessions": (os.environ.get("DB_SESSIONS"), ["sessions.session"]),
+}
+for alias, (path, models) in SPLIT_DATABASES.items():
+    if path:
+        DATABASES[alias] = {"ENGINE": "django.db.backends.sqlite3", "NAME": path}
+        DATABASE_MODELS.update(dict.fromkeys(models, alias))
+
+# реплики только для чтения: пути к копиям базы через запятую, их наполняет
+# внешняя репликация (litestream, LiteFS); чтения разводит yatube/routers.py
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get("DB_REPLICAS", "").split(","))
+):
+    alias = f"replica{number + 1}"
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path.strip(),
+        # в тестах реплики смотрят в тестовую основную базу
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["yatube.routers.SplitRouter", "yatube.routers.ReplicaRouter"]
+# столько секунд после записи пользователь читает с основной базы
+REPLICATION_LAG = int(os.environ.get("REPLICATION_LAG", 5))
+
+# профиль SQLite для продакшна: WAL и прочие pragma на каждом соединении
+# (yatube/sqlite.py) и соединения, живущие дольше одного запроса
+SQLITE_PRODUCTION = os.environ.get("SQLITE_PRODUCTION") == "1"
+SQLITE_PRAGMAS = {}
+SQLITE_TRANSACTION_MODE = None
+if SQLITE_PRODUCTION:
+    from yatube.sqlite import PRODUCTION_PRAGMAS, PRODUCTION_TRANSACTION_MODE
+
+    SQLITE_PRAGMAS = PRODUCTION_PRAGMAS
+    SQLITE_TRANSACTION_MODE = PRODUCTION_TRANSACTION_MODE
+    for database in DATABASES.values():
+        database["CONN_MAX_AGE"] = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,3 +188,6 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# загрузки всегда пишутся во временный файл и обрезаются по размеру
+FILE_UPLOAD_HANDLERS = ["posts.uploads.LimitedTemporaryFileUploadHandler"]
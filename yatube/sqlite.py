@@ -0,0 +1,54 @@
+"""Per-connection SQLite tuning.
+
+Django opens SQLite with the library defaults: a rollback journal that
+blocks readers while anybody writes, a full fsync on every commit and no
+busy timeout of its own. When ``settings.SQLITE_PRAGMAS`` is set, every new
+connection runs those pragmas; ``PRODUCTION_PRAGMAS`` is the profile used
+in production (see ``SQLITE_PRODUCTION`` in settings).
+
+``settings.SQLITE_TRANSACTION_MODE`` (like the ``transaction_mode`` option of
+newer Django versions) makes ``atomic()`` start with ``BEGIN IMMEDIATE``: a
+deferred transaction that reads first and writes later cannot wait for the
+write lock and fails with "database is locked" at once.
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PRODUCTION_PRAGMAS = {
+    # читатели не ждут писателя, писатели не ждут читателей
+    "journal_mode": "WAL",
+    # в режиме WAL fsync только на чекпойнтах; сбой питания может потерять
+    # последние транзакции, но не испортить базу
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # в KiB, если отрицательное
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    # сколько ждать освободившейся блокировки, прежде чем "database is locked"
+    "busy_timeout": 5000,
+}
+PRODUCTION_TRANSACTION_MODE = "IMMEDIATE"
+
+
+def apply_pragmas(connection, pragmas):
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", None)
+    if pragmas:
+        apply_pragmas(connection, pragmas)
+    mode = getattr(settings, "SQLITE_TRANSACTION_MODE", None)
+    if mode:
+
+        def begin():
+            connection.cursor().execute(f"BEGIN {mode}")
+
+        connection._start_transaction_under_autocommit = begin
@@ -0,0 +1,342 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import connection, connections
+from django.db.models import ProtectedError
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.shortcuts import reverse
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from posts import counters
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.paginators import CachedCountPaginator, encode_cursor
+
+from .cache import EPOCH_KEY
+from .routers import PIN_COOKIE, PrimaryPinMiddleware, use_primary
+from .sqlite import PRODUCTION_PRAGMAS
+
+
+class TestTwoTierCache(TestCase):
+    def setUp(self):
+        """Start from empty tiers"""
+        cache.clear()
+        self.shared = caches["shared"]
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Second read is answered by the in-process tier"""
+        self.shared.set("answer", 42)
+        before = cache.stats()
+        self.assertEqual(cache.get("answer"), 42)
+        self.assertEqual(cache.get("answer"), 42)
+        after = cache.stats()
+        self.assertEqual(after["shared_hits"] - before["shared_hits"], 1)
+        self.assertEqual(after["local_hits"] - before["local_hits"], 1)
+
+    def test_write_by_other_worker_invalidates(self):
+        """A new epoch in the shared tier drops local copies"""
+        cache.set("answer", 42)
+        self.assertEqual(cache.get("answer"), 42)
+        # другой воркер пишет напрямую в общий кэш и меняет эпоху
+        self.shared.set("answer", 43)
+        self.shared.set(EPOCH_KEY, 1)
+        self.assertEqual(cache.get("answer"), 42)
+        request_started.send(sender=None)
+        self.assertEqual(cache.get("answer"), 43)
+
+    def test_only_mutable_keys_change_epoch(self):
+        """Page and lock writes keep local copies, stamp writes drop them"""
+        epoch = self.shared.get(EPOCH_KEY)
+        cache.set("page:index:anon:1", "page")
+        cache.add("page:index:anon:1:lock", 1)
+        cache.delete("page:index:anon:1:lock")
+        self.assertEqual(self.shared.get(EPOCH_KEY), epoch)
+        cache.set_many({"generation:index": 1, "generation:all": 1})
+        self.assertNotEqual(self.shared.get(EPOCH_KEY), epoch)
+
+    def test_values_are_copies(self):
+        """Mutating a returned value does not change the cached one"""
+        cache.set("data", {"a": 1})
+        cache.get("data")["a"] = 2
+        self.assertEqual(cache.get("data"), {"a": 1})
+
+    def test_get_many_and_incr(self):
+        """Multi-get mixes both tiers, incr goes through the shared tier"""
+        cache.set("one", 1)
+        self.shared.set("two", 2)
+        self.assertEqual(cache.get_many(["one", "two", "three"]), {"one": 1, "two": 2})
+        self.assertEqual(cache.incr("one"), 2)
+        self.assertEqual(cache.get("one"), 2)
+
+
+@override_settings(
+    SQLITE_PRAGMAS=PRODUCTION_PRAGMAS, SQLITE_TRANSACTION_MODE="IMMEDIATE"
+)
+class TestSqliteProfile(TestCase):
+    def setUp(self):
+        """A separate connection to a database file"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "db.sqlite3")
+        self.wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": self.path})
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        """New connections get WAL and the tuned pragmas"""
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("cache_size"), -64 * 1024)
+
+    def test_transactions_take_write_lock(self):
+        """atomic() begins immediately, other writers have to wait"""
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        self.addCleanup(self.wrapper.connection.rollback)
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, "locked"):
+            other.execute("BEGIN IMMEDIATE")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICATION_LAG=5)
+class TestReplicaRouting(TransactionTestCase):
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        """A replica in a separate database file"""
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = {
+            **connection.settings_dict,
+            "NAME": os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.databases["replica"]
+        cls.directory.cleanup()
+
+    def replicate(self):
+        """Copy the primary into the replica, as replication would"""
+        connections["replica"].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(connections.databases["replica"]["NAME"])
+        connection.connection.backup(target)
+        target.close()
+
+    def setUp(self):
+        self.author = get_user_model().objects.create_user(username="writer")
+        self.post = Post.objects.create(text="Replicated", author=self.author)
+        self.replicate()
+        self.client = Client()
+        self.client.force_login(self.author)
+        cache.clear()
+
+    def test_reads_go_to_replica(self):
+        """Posts appear to readers once they are replicated"""
+        Post.objects.create(text="Fresh", author=self.author)
+        url = reverse("search") + "?q=Fresh"
+        self.assertEqual(len(Client().get(url).context["page"]), 0)
+        self.replicate()
+        self.assertEqual(len(Client().get(url).context["page"]), 1)
+
+    def test_writes_go_to_primary(self):
+        """New posts are saved on the primary only"""
+        self.client.post(reverse("new_post"), {"text": "From the form"})
+        self.assertTrue(Post.objects.using("default").filter(text="From the form"))
+        self.assertFalse(Post.objects.using("replica").filter(text="From the form"))
+
+    def test_writer_reads_own_writes(self):
+        """After a write the writer reads from the primary for a while"""
+        url = reverse("search") + "?q=Own"
+        response = self.client.post(reverse("new_post"), {"text": "Own post"})
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 5)
+        self.assertEqual(len(self.client.get(url).context["page"]), 1)
+        self.assertEqual(len(Client().get(url).context["page"]), 0)
+
+    def test_validated_pages_read_from_primary(self):
+        """Pages with stamp validators never pair new validators with old data"""
+        Comment.objects.create(post=self.post, author=self.author, text="Fresh")
+        url = reverse("post_single", args=["writer", self.post.pk])
+        self.assertContains(Client().get(url), "Fresh")
+
+    def test_middleware_serves_async_requests_concurrently(self):
+        """Under ASGI the pin middleware neither queues requests nor loses writes"""
+        arrived = []
+        everyone = asyncio.Event()
+
+        async def get_response(request):
+            arrived.append(request)
+            if len(arrived) == 2:
+                everyone.set()
+            await asyncio.wait_for(everyone.wait(), 5)
+            if "write" in request.GET:
+                await sync_to_async(Post.objects.create)(
+                    text="Async", author=self.author
+                )
+            return HttpResponse()
+
+        middleware = PrimaryPinMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        async def requests():
+            return await asyncio.gather(
+                middleware(RequestFactory().get("/", {"write": 1})),
+                middleware(RequestFactory().get("/")),
+            )
+
+        wrote, read = async_to_sync(requests)()
+        self.assertIn(PIN_COOKIE, wrote.cookies)
+        self.assertNotIn(PIN_COOKIE, read.cookies)
+
+    def test_cached_pages_rendered_from_primary(self):
+        """Pages that go to the cache do not keep a lagging replica's data"""
+        # на реплике остаётся счётчик: страница читается без записей
+        Client().get(reverse("index"))
+        self.replicate()
+        Post.objects.create(text="Fresh", author=self.author)
+        self.assertContains(Client().get(reverse("index")), "Fresh")
+
+    def test_streamed_feeds_read_from_primary(self):
+        """Feeds cached for hours do not keep a lagging replica's entries"""
+        Post.objects.create(text="Fresh", author=self.author)
+        response = Client().get(reverse("feed_index", args=["atom"]))
+        # поток теста писал и закреплён за основной базой, поток сервера — нет
+        with use_primary(pin=False):
+            self.assertIn(b"Fresh", b"".join(response.streaming_content))
+
+    def test_live_counts_read_from_primary(self):
+        """Live notifications count posts the replica has not got yet"""
+        Post.objects.create(text="Fresh", author=self.author)
+        since = encode_cursor(self.post.pub_date, self.post.pk)
+        response = Client().get(reverse("live_index"), {"since": since})
+        with use_primary(pin=False):
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            event = next(chunks).decode()
+            response.close()
+        self.assertIn('"count": 1', event)
+
+    def test_counters_recounted_on_primary(self):
+        """A missing list size is counted on the primary"""
+        Post.objects.create(text="Fresh", author=self.author)
+        with use_primary(pin=False):
+            paginator = CachedCountPaginator(Post.objects.all(), 10, counters.INDEX)
+            self.assertEqual(paginator.count, 2)
+
+
+@override_settings(
+    DATABASE_MODELS={"posts.comment": "social", "posts.follow": "social"}
+)
+class TestSplitDatabases(TransactionTestCase):
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        """Comments and follows in a separate database file"""
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "social.sqlite3")
+        connections.databases["social"] = {**connection.settings_dict, "NAME": cls.path}
+        super().setUpClass()
+        call_command("migrate", database="social", verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["social"].close()
+        del connections["social"]
+        del connections.databases["social"]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.author = get_user_model().objects.create_user(username="writer")
+        self.reader = get_user_model().objects.create_user(username="reader")
+        self.post = Post.objects.create(text="Post", author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_comments_stored_separately(self):
+        """Comments go to their database, counters stay in the main one"""
+        self.client.post(
+            reverse("add_comment", args=["writer", self.post.pk]), {"text": "Hi"}
+        )
+        self.assertEqual(Comment.objects.using("social").count(), 1)
+        self.assertEqual(Comment.objects.using("default").count(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        response = self.client.get(
+            reverse("post_single", args=["writer", self.post.pk])
+        )
+        self.assertContains(response, "Hi")
+        self.assertEqual(response.context["items"][0].author, self.reader)
+
+    def test_follows_stored_separately(self):
+        """Follows go to their database, timelines stay in the main one"""
+        self.client.get(reverse("profile_follow", args=["writer"]))
+        self.assertTrue(Follow.objects.using("social").filter(author=self.author))
+        self.assertFalse(Follow.objects.using("default").exists())
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader))
+        response = self.client.get(reverse("follow_index"))
+        self.assertEqual(list(response.context["page"]), [self.post])
+        response = self.client.get(reverse("profile", args=["writer"]))
+        self.assertTrue(response.context["following"])
+        self.assertEqual(response.context["stats"].followers, 1)
+
+    def test_separate_write_locks(self):
+        """A writer holding the social database does not block posting"""
+        other = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(other.close)
+        other.execute("BEGIN IMMEDIATE")
+        Post.objects.create(text="Not blocked", author=self.author)
+        other.execute("ROLLBACK")
+
+    def test_deletion_protected(self):
+        """Posts and users with comments in the other database are kept"""
+        Comment.objects.create(post=self.post, author=self.reader, text="Hi")
+        with self.assertRaises(ProtectedError):
+            self.post.delete()
+        with self.assertRaises(ProtectedError):
+            self.reader.delete()
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+
+    def test_admin_lists_protected_objects(self):
+        """The admin explains what blocks a deletion instead of failing"""
+        comment = Comment.objects.create(post=self.post, author=self.reader, text="Hi")
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        admin = get_user_model().objects.create_superuser("admin", "a@a.ru", "1")
+        self.client.force_login(admin)
+        cases = (
+            (reverse("admin:posts_post_delete", args=[self.post.pk]), comment),
+            (reverse("admin:auth_user_delete", args=[self.reader.pk]), follow),
+        )
+        for url, protected in cases:
+            with self.subTest(url=url):
+                response = self.client.post(url, {"post": "yes"})
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, f": {protected}<")
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertTrue(get_user_model().objects.filter(pk=self.reader.pk).exists())